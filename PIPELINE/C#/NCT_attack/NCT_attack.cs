@@ -40,6 +40,13 @@ public class ConstrainedOptimizerGraph
     private readonly double importanceThreshold;
     private readonly List<string> parentFeatures; // родительские признаки (importance >= порог)
     
+    private long queries; // число вызовов VerifyImage
+    
+    /// Всего вызовов VerifyImage с момента создания оптимизатора
+    public long Queries => queries;
+    
+    public int EarlyStopping => earlyStopping;
+    
     public ConstrainedOptimizerGraph(
         NCT nct,
         BitArray key,
@@ -102,6 +109,15 @@ public class ConstrainedOptimizerGraph
         return parents;
     }
     
+    /// Вызовов VerifyImage на одну итерацию атаки: проверка расстояния + 2 на каждого партнёра
+    public int QueriesPerIteration(int featureCount)
+    {
+        int partnersCount = parentFeatures
+            .SelectMany(id => graph.Features[id].Partners.Keys)
+            .Count(key => int.TryParse(key, out int partnerId) && partnerId >= 0 && partnerId < featureCount);
+        return 1 + 2 * partnersCount;
+    }
+    
     /// <summary>
     /// Выполнить атаку на образец
     /// </summary>
@@ -154,36 +170,7 @@ public class ConstrainedOptimizerGraph
                 }
             }
             
-            //  Для каждого родительского признака
-            foreach (string parentId in parentFeatures)
-            {
-                GraphFeature parentFeat = graph.Features[parentId];
-                Dictionary<string, double> partners = parentFeat.Partners;
-                
-                // ля каждого дочернего признака (партнёра)
-                foreach (var kvp in partners)
-                {
-                    string partnerIdStr = kvp.Key;
-                    double partnerImportance = kvp.Value;
-                    
-                    if (!int.TryParse(partnerIdStr, out int partnerId))
-                        continue;
-                    
-                    if (partnerId < 0 || partnerId >= currentImage.Length)
-                        continue;
-                    
-                    // максимальное изменение
-                    double maxChange = (1.0 - partnerImportance) * learningRate * stepSize;
-                    
-                    // градиент
-                    double gradient = ComputeGradient(partnerId, trueClass, currentImage);
-                    
-                    if (gradient > 0)
-                        currentImage[partnerId] -= maxChange;
-                    else
-                        currentImage[partnerId] += maxChange;
-                }
-            }
+            Step(currentImage, trueClass);
         }
         
         // Console.WriteLine("[DONE] Атака завершена");
@@ -200,11 +187,49 @@ public class ConstrainedOptimizerGraph
         ));
     }
     
+    /// <summary>
+    /// Одна итерация атаки: сдвиг партнёров всех родительских признаков по знаку градиента
+    /// </summary>
+    public void Step(double[] currentImage, int trueClass)
+    {
+        //  Для каждого родительского признака
+        foreach (string parentId in parentFeatures)
+        {
+            GraphFeature parentFeat = graph.Features[parentId];
+            Dictionary<string, double> partners = parentFeat.Partners;
+            
+            // ля каждого дочернего признака (партнёра)
+            foreach (var kvp in partners)
+            {
+                string partnerIdStr = kvp.Key;
+                double partnerImportance = kvp.Value;
+                
+                if (!int.TryParse(partnerIdStr, out int partnerId))
+                    continue;
+                
+                if (partnerId < 0 || partnerId >= currentImage.Length)
+                    continue;
+                
+                // максимальное изменение
+                double maxChange = (1.0 - partnerImportance) * learningRate * stepSize;
+                
+                // градиент
+                double gradient = ComputeGradient(partnerId, trueClass, currentImage);
+                
+                if (gradient > 0)
+                    currentImage[partnerId] -= maxChange;
+                else
+                    currentImage[partnerId] += maxChange;
+            }
+        }
+    }
+    
     /// <summary>
     /// Вычислить расстояние Хэмминга
     /// </summary>
-    private int ComputeHammingDistance(double[] image, int trueClass)
+    public int ComputeHammingDistance(double[] image, int trueClass)
     {
+        queries++;
         BitArray code = nct.VerifyImage(image);
         BitArray keyBits = key;
         
@@ -241,7 +266,7 @@ public class ConstrainedOptimizerGraph
     /// <summary>
     /// Собрать метрики
     /// </summary>
-    private AttackMetrics BuildMetrics(
+    internal AttackMetrics BuildMetrics(
         List<int> distancesHistory,
         int iterationsCompleted,
         bool earlyStoppedFlag,
@@ -297,6 +322,249 @@ public class AttackMetrics
     
     [JsonProperty("sample_index")]
     public int SampleIndex { get; set; }
+    
+    [JsonProperty("queries_spent")]
+    public long QueriesSpent { get; set; }
+    
+    [JsonProperty("status")]
+    public string Status { get; set; }
+    
+    [JsonProperty("success")]
+    public bool Success { get; set; }
+}
+
+/// <summary>
+/// Точка кривой "успешность от числа запросов"
+/// </summary>
+public class BudgetPoint
+{
+    [JsonProperty("queries")]
+    public long Queries { get; set; }
+    
+    [JsonProperty("successes")]
+    public int Successes { get; set; }
+    
+    [JsonProperty("success_rate")]
+    public double SuccessRate { get; set; }
+}
+
+/// <summary>
+/// Состояние атаки одного образца под управлением планировщика
+/// </summary>
+public class SampleBudgetState
+{
+    public int Index { get; set; }
+    public double[] Image { get; set; }
+    public List<int> DistancesHistory { get; } = new List<int>();
+    public int Iterations { get; set; }
+    public long Queries { get; set; }
+    public int BestDistance { get; set; } = int.MaxValue;
+    public int LastImprovementIteration { get; set; }
+    public string Status { get; set; } = "active"; // active / success / stalled / retired / budget / max_iterations
+    
+    public int CurrentDistance => DistancesHistory[DistancesHistory.Count - 1];
+}
+
+/// <summary>
+/// Планировщик глобального бюджета запросов (вызовов VerifyImage) по всем образцам.
+/// Successive halving: в раунде r каждый активный образец получает rungIterations * eta^r итераций,
+/// после раунда образцы ранжируются по оценке числа итераций до успеха
+/// (остаток до порога / скорость улучшения за раунд), и дальше проходит лучшая 1/eta часть.
+/// Образцы без улучшения за earlyStopping итераций (если earlyStopping > 0) снимаются сразу.
+/// </summary>
+public class QueryBudgetScheduler
+{
+    private readonly ConstrainedOptimizerGraph optimizer;
+    private readonly long queryBudget;
+    private readonly int hammingThreshold;
+    private readonly int rungIterations;
+    private readonly double eta;
+    private readonly int maxIterations;
+    
+    private long queriesStart;
+    
+    public List<BudgetPoint> BudgetCurve { get; } = new List<BudgetPoint>();
+    
+    public long QueriesSpent => optimizer.Queries - queriesStart;
+    
+    public QueryBudgetScheduler(
+        ConstrainedOptimizerGraph optimizer,
+        long queryBudget,
+        int hammingThreshold = 15,
+        int rungIterations = 5,
+        double eta = 2.0,
+        int maxIterations = 100
+    )
+    {
+        this.optimizer = optimizer;
+        this.queryBudget = queryBudget;
+        this.hammingThreshold = hammingThreshold;
+        this.rungIterations = Math.Max(1, rungIterations);
+        this.eta = Math.Max(1.0, eta);
+        this.maxIterations = maxIterations;
+    }
+    
+    private long Remaining => queryBudget - QueriesSpent;
+    
+    /// <summary>
+    /// Атаковать все образцы в пределах бюджета
+    /// </summary>
+    public List<(double[] adversarialImage, AttackMetrics metrics)> Run(List<double[]> images, int trueClass)
+    {
+        queriesStart = optimizer.Queries;
+        var states = new List<SampleBudgetState>();
+        
+        for (int idx = 0; idx < images.Count; idx++)
+        {
+            var state = new SampleBudgetState { Index = idx, Image = (double[])images[idx].Clone() };
+            states.Add(state);
+            
+            // бюджет кончился до первой проверки — образец остаётся непосещённым
+            if (Remaining <= 0)
+            {
+                state.Status = "budget";
+                continue;
+            }
+            Record(state, optimizer.ComputeHammingDistance(state.Image, trueClass), 1);
+            if (state.CurrentDistance < hammingThreshold)
+                state.Status = "success";
+        }
+        AddPoint(states, images.Count);
+        
+        var active = states.Where(s => s.Status == "active").ToList();
+        int iterationCost = images.Count > 0 ? optimizer.QueriesPerIteration(images[0].Length) : 0;
+        int round = 0;
+        bool exhausted = false;
+        
+        while (active.Count > 0 && !exhausted)
+        {
+            int rung = (int)Math.Min(maxIterations, rungIterations * Math.Pow(eta, round));
+            var rates = new Dictionary<int, double>();
+            
+            foreach (var state in active)
+            {
+                int startDistance = state.CurrentDistance;
+                int done = 0;
+                
+                while (done < rung && state.Iterations < maxIterations)
+                {
+                    if (Remaining < iterationCost)
+                    {
+                        exhausted = true;
+                        break;
+                    }
+                    
+                    long before = optimizer.Queries;
+                    optimizer.Step(state.Image, trueClass);
+                    int distance = optimizer.ComputeHammingDistance(state.Image, trueClass);
+                    // сначала счётчик: LastImprovementIteration — номер итерации, давшей улучшение,
+                    // и остановка наступает после EarlyStopping итераций без улучшения, как в Attack
+                    state.Iterations++;
+                    Record(state, distance, optimizer.Queries - before);
+                    done++;
+                    
+                    if (distance < hammingThreshold)
+                    {
+                        state.Status = "success";
+                        AddPoint(states, images.Count);
+                        break;
+                    }
+                    if (optimizer.EarlyStopping > 0 &&
+                        state.Iterations - state.LastImprovementIteration >= optimizer.EarlyStopping)
+                    {
+                        state.Status = "stalled";
+                        break;
+                    }
+                }
+                
+                if (state.Status == "active" && state.Iterations >= maxIterations)
+                    state.Status = "max_iterations";
+                rates[state.Index] = done > 0 ? (double)(startDistance - state.CurrentDistance) / done : 0.0;
+                
+                if (exhausted)
+                    break;
+            }
+            
+            // ранжирование: меньше оценка итераций до успеха — перспективнее
+            var survivors = active
+                .Where(s => s.Status == "active")
+                .OrderBy(s => EstimatedIterations(s, rates.TryGetValue(s.Index, out double r) ? r : 0.0))
+                .ThenBy(s => s.CurrentDistance)
+                .ToList();
+            
+            int keep = exhausted ? survivors.Count : (int)Math.Ceiling(survivors.Count / eta);
+            foreach (var state in survivors.Skip(keep))
+                state.Status = "retired";
+            active = survivors.Take(keep).ToList();
+            
+            AddPoint(states, images.Count);
+            Console.WriteLine($"  Раунд {round}: {rung} итераций/образец, запросов {QueriesSpent}/{queryBudget}, " +
+                              $"успешно {states.Count(s => s.Status == "success")}, активно {active.Count}");
+            round++;
+        }
+        
+        foreach (var state in states.Where(s => s.Status == "active"))
+            state.Status = "budget";
+        
+        return states.Select(s =>
+        {
+            string reason = s.Status switch
+            {
+                "success" => "Hamming distance below threshold",
+                "stalled" => $"No improvement for {optimizer.EarlyStopping} iterations",
+                "retired" => "Retired by scheduler (successive halving)",
+                "budget" => "Query budget exhausted",
+                _ => "Max iterations reached"
+            };
+            bool stoppedEarly = s.Status != "success" && s.Status != "max_iterations";
+            
+            // непосещённый образец: расстояние не измерялось (-1)
+            var metrics = s.DistancesHistory.Count > 0
+                ? optimizer.BuildMetrics(s.DistancesHistory, s.Iterations, stoppedEarly, reason)
+                : new AttackMetrics
+                {
+                    InitialHammingDistance = -1,
+                    FinalHammingDistance = -1,
+                    DistancesHistory = new List<int>(),
+                    StoppedEarly = true,
+                    Reason = reason
+                };
+            metrics.SampleIndex = s.Index;
+            metrics.QueriesSpent = s.Queries;
+            metrics.Status = s.Status;
+            metrics.Success = s.Status == "success";
+            return (s.Image, metrics);
+        }).ToList();
+    }
+    
+    private void Record(SampleBudgetState state, int distance, long queries)
+    {
+        state.DistancesHistory.Add(distance);
+        state.Queries += queries;
+        if (distance < state.BestDistance)
+        {
+            state.BestDistance = distance;
+            state.LastImprovementIteration = state.Iterations;
+        }
+    }
+    
+    private double EstimatedIterations(SampleBudgetState state, double rate)
+    {
+        if (rate <= 0.0)
+            return double.PositiveInfinity;
+        return (state.CurrentDistance - hammingThreshold + 1) / rate;
+    }
+    
+    private void AddPoint(List<SampleBudgetState> states, int total)
+    {
+        int successes = states.Count(s => s.Status == "success");
+        BudgetCurve.Add(new BudgetPoint
+        {
+            Queries = QueriesSpent,
+            Successes = successes,
+            SuccessRate = total > 0 ? (double)successes / total : 0.0
+        });
+    }
 }
 
 /// <summary>
@@ -316,6 +584,10 @@ public class AttackRunnerGraph
         int batchSize = 10;
         int targetNct = 0;
         int earlyStopping = 30;
+        long queryBudget = 0;
+        int hammingThreshold = 15;
+        int rungIterations = 5;
+        double halvingRate = 2.0;
         
         for (int i = 0; i < args.Length; i++)
         {
@@ -339,6 +611,14 @@ public class AttackRunnerGraph
                 batchSize = int.Parse(args[++i]);
             else if (args[i] == "--target-nct" && i + 1 < args.Length)
                 targetNct = int.Parse(args[++i]);
+            else if (args[i] == "--query-budget" && i + 1 < args.Length)
+                queryBudget = long.Parse(args[++i]);
+            else if (args[i] == "--hamming-threshold" && i + 1 < args.Length)
+                hammingThreshold = int.Parse(args[++i]);
+            else if (args[i] == "--rung-iterations" && i + 1 < args.Length)
+                rungIterations = int.Parse(args[++i]);
+            else if (args[i] == "--halving-rate" && i + 1 < args.Length)
+                halvingRate = double.Parse(args[++i], CultureInfo.InvariantCulture);
             else if (args[i] == "--help")
             {
                 PrintHelp();
@@ -390,8 +670,26 @@ public class AttackRunnerGraph
             
             var allMetrics = new List<AttackMetrics>();
             var adversarialImages = new List<double[]>();
+            var budgetCurve = new List<BudgetPoint>();
             
-            for (int idx = 0; idx < batchEnd; idx++)
+            if (queryBudget > 0)
+            {
+                Console.WriteLine($"ПЛАНИРОВЩИК БЮДЖЕТА: {queryBudget} запросов на {batchEnd} образцов");
+                var scheduler = new QueryBudgetScheduler(
+                    optimizer,
+                    queryBudget: queryBudget,
+                    hammingThreshold: hammingThreshold,
+                    rungIterations: rungIterations,
+                    eta: halvingRate,
+                    maxIterations: nIterations
+                );
+                var results = scheduler.Run(data.Take(batchEnd).Select(d => d.Item3).ToList(), targetNct);
+                adversarialImages.AddRange(results.Select(r => r.adversarialImage));
+                allMetrics.AddRange(results.Select(r => r.metrics));
+                budgetCurve = scheduler.BudgetCurve;
+            }
+            
+            for (int idx = 0; queryBudget <= 0 && idx < batchEnd; idx++)
             {
                 //int id = data[idx].Item1;
                 //int Class = data[idx].Item2;
@@ -402,6 +700,7 @@ public class AttackRunnerGraph
 
 
                 double[] features = data[idx].Item3;
+                long queriesBefore = optimizer.Queries;
                 var (adversarialImage, metrics) = optimizer.Attack(
                     image: features,
                     trueClass: targetNct,
@@ -410,6 +709,9 @@ public class AttackRunnerGraph
                 );
                 
                 metrics.SampleIndex = idx;
+                metrics.QueriesSpent = optimizer.Queries - queriesBefore;
+                metrics.Success = metrics.FinalHammingDistance < hammingThreshold;
+                metrics.Status = metrics.Success ? "success" : metrics.StoppedEarly ? "stalled" : "max_iterations";
                 adversarialImages.Add(adversarialImage);
                 allMetrics.Add(metrics);
                 
@@ -417,6 +719,14 @@ public class AttackRunnerGraph
                 Console.WriteLine($"  - Исходное расстояние: {metrics.InitialHammingDistance}");
                 Console.WriteLine($"  - Финальное расстояние: {metrics.FinalHammingDistance}");
                 Console.WriteLine($"  - Улучшение: {metrics.Improvement}");
+                
+                int successes = allMetrics.Count(m => m.Success);
+                budgetCurve.Add(new BudgetPoint
+                {
+                    Queries = optimizer.Queries,
+                    Successes = successes,
+                    SuccessRate = (double)successes / batchEnd
+                });
             }
             
             Directory.CreateDirectory(outputDir);
@@ -430,8 +740,16 @@ public class AttackRunnerGraph
                 {
                     learning_rate = learningRate,
                     step_size = stepSize,
-                    n_iterations = nIterations
+                    n_iterations = nIterations,
+                    query_budget = queryBudget,
+                    hamming_threshold = hammingThreshold,
+                    rung_iterations = rungIterations,
+                    halving_rate = halvingRate
                 },
+                total_queries = optimizer.Queries,
+                // знаменатель — все образцы пакета, как в budget_curve
+                success_rate = batchEnd > 0 ? (double)allMetrics.Count(m => m.Success) / batchEnd : 0.0,
+                budget_curve = budgetCurve,
                 metrics = allMetrics
             };
             
@@ -456,14 +774,18 @@ public class AttackRunnerGraph
             Console.WriteLine("");
             Console.WriteLine("СТАТИСТИКА АТАКИ");
             
-            var initialDistances = allMetrics.Select(m => m.InitialHammingDistance).ToList();
-            var finalDistances = allMetrics.Select(m => m.FinalHammingDistance).ToList();
-            var improvements = allMetrics.Select(m => m.Improvement).ToList();
+            var visited = allMetrics.Where(m => m.DistancesHistory.Count > 0).ToList();
+            var initialDistances = visited.Select(m => m.InitialHammingDistance).DefaultIfEmpty(0).ToList();
+            var finalDistances = visited.Select(m => m.FinalHammingDistance).DefaultIfEmpty(0).ToList();
+            var improvements = visited.Select(m => m.Improvement).DefaultIfEmpty(0).ToList();
             
-            Console.WriteLine($"  - Атаковано образцов: {allMetrics.Count}");
+            Console.WriteLine($"  - Атаковано образцов: {visited.Count}/{allMetrics.Count}");
             Console.WriteLine($"  - Среднее исходное расстояние: {initialDistances.Average():F2}");
             Console.WriteLine($"  - Среднее финальное расстояние: {finalDistances.Average():F2}");
             Console.WriteLine($"  - Среднее улучшение: {improvements.Average():F2}");
+            Console.WriteLine($"  - Вызовов VerifyImage: {optimizer.Queries}");
+            int ownCount = allMetrics.Count(m => m.Success);
+            Console.WriteLine($"  - Hamming < {hammingThreshold}: {ownCount}/{allMetrics.Count}");
             
             int successCount = allMetrics.Count(m => m.Improvement > 0);
             double successRate = (double)successCount / allMetrics.Count;
@@ -527,6 +849,10 @@ public class AttackRunnerGraph
         Console.WriteLine("  --early-stopping <int>      Patience: iterations without improvement (default: 30)");
         Console.WriteLine("  --batch-size <int>          Batch size (default: 10, 0 = all)");
         Console.WriteLine("  --target-nct <int>          Target NCT index (default: 0)");
+        Console.WriteLine("  --query-budget <long>       Global VerifyImage budget, successive halving (default: 0 = off)");
+        Console.WriteLine("  --hamming-threshold <int>   Success: Hamming distance below threshold (default: 15)");
+        Console.WriteLine("  --rung-iterations <int>     Iterations per sample in the first round (default: 5)");
+        Console.WriteLine("  --halving-rate <double>     Keep 1/rate of samples after each round (default: 2)");
         Console.WriteLine("  --help                      Show this help message");
         Console.WriteLine("");
     }
@@ -3,7 +3,10 @@ from typing import Dict, List
 from pathlib import Path
 from dataclasses import dataclass
 
+import numpy as np
+
 from logger import get_logger
+from correlation import load_correlation
 
 logger = get_logger(__name__)
 
@@ -20,7 +23,8 @@ class MetaFeature:
 
 class CorrelationGraphBuilder:
     
-    def __init__(self, meta_path: str, nct_index: int = 0):
+    def __init__(self, meta_path: str, nct_index: int = 0,
+                 correlation_path: str = None, correlation_class: int = None):
         self.meta_path = Path(meta_path)
         if not self.meta_path.exists():
             raise FileNotFoundError(f"File not found: {self.meta_path}")
@@ -32,9 +36,17 @@ class CorrelationGraphBuilder:
         self.nct_data = meta['ncts'][self.nct_index]
         self.n_neurons = meta['neurons_count']
         self.n_features = meta['feature_count']
+
+        # Измеренные корреляции признаков (correlation.py); по умолчанию класс Свой = nct_index
+        self.correlation = None
+        if correlation_path:
+            if correlation_class is None:
+                correlation_class = self.nct_index
+            self.correlation = np.nan_to_num(load_correlation(correlation_path, correlation_class))
         
         # Структуры данных для анализа
         self.feature_partners = {}      # feature -> set(feature_t)
+        self.partner_correlation = {}   # feature -> {partner: corr со знаком} (если заданы корреляции)
         self.feature_importance = {}    # feature -> importance score
         self.feature_degree = {}        # feature -> degree
         self.neurons_by_feature = {}    # feature -> list(neuron_idx)
@@ -89,8 +101,14 @@ class CorrelationGraphBuilder:
             if owner not in self.feature_partners:
                 self.feature_partners[owner] = {}
             
-            partner_degree = temp_degree.get(partner, 0)
-            self.feature_partners[owner][partner] = partner_degree
+            if self.correlation is not None:
+                corr = float(self.correlation[owner, partner])
+                # в partners — |corr| (вес шага в атаке), знак сохраняется отдельно
+                self.feature_partners[owner][partner] = abs(corr)
+                self.partner_correlation.setdefault(owner, {})[partner] = corr
+            else:
+                partner_degree = temp_degree.get(partner, 0)
+                self.feature_partners[owner][partner] = partner_degree
 
         for owner in self.feature_partners:
             self.feature_degree[owner] = len(self.feature_partners[owner])
@@ -124,7 +142,7 @@ class CorrelationGraphBuilder:
 
             sorted_partners = sorted(
                 partners.items(),
-                key=lambda x: self.feature_importance.get(x[0], 0.0), 
+                key=lambda x: self.get_edge_weight(x[0], x[1]), 
                 reverse=True 
             )
             
@@ -134,13 +152,20 @@ class CorrelationGraphBuilder:
                 "neurons": sorted(list(self.neurons_by_feature.get(feature_id, set()))),
                 "neurons_count": len(self.neurons_by_feature.get(feature_id, set())),
                 "partners": {
-                    str(partner_id): round(self.feature_importance.get(partner_id, 0.0), 4)
+                    str(partner_id): round(self.get_edge_weight(partner_id, weight), 4)
                     for partner_id, weight in sorted_partners
                 },
             }
+            if self.correlation is not None:
+                signed = self.partner_correlation.get(feature_id, {})
+                features_dict[str(feature_id)]["partner_correlation"] = {
+                    str(partner_id): round(signed[partner_id], 4)
+                    for partner_id, _ in sorted_partners
+                }
         
         graph_data = {
             "nct_index": self.nct_index,
+            "edge_weights": "correlation" if self.correlation is not None else "importance",
             "features": features_dict,
         }
         
@@ -167,6 +192,13 @@ class CorrelationGraphBuilder:
 
     def get_feature_importance(self, feature_id: int) -> float:
         return self.feature_importance.get(feature_id, 0.0)
+
+
+    def get_edge_weight(self, partner_id: int, weight: float) -> float:
+        # |corr| ребра, если заданы корреляции, иначе importance партнёра
+        if self.correlation is not None:
+            return weight
+        return self.feature_importance.get(partner_id, 0.0)
     
 
     def get_partners(self, feature_id: int, top_n: int = None) -> List[int]:
@@ -214,7 +246,24 @@ if __name__ == "__main__":
         default=0,
         help="Индекс NCT в массиве"
     )
+    parser.add_argument(
+        "--correlation-path",
+        type=str,
+        default=None,
+        help="Путь к correlation.npz: веса партнёров = |корреляция| признаков"
+    )
+    parser.add_argument(
+        "--correlation-class",
+        type=int,
+        default=None,
+        help="Класс корреляционной матрицы (по умолчанию nct-index)"
+    )
     
     args = parser.parse_args()
-    builder = CorrelationGraphBuilder(args.meta_path)
+    builder = CorrelationGraphBuilder(
+        args.meta_path,
+        nct_index=args.nct_index,
+        correlation_path=args.correlation_path,
+        correlation_class=args.correlation_class,
+    )
     builder.save_graph_to_json(args.output_path)
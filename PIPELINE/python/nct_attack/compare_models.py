@@ -0,0 +1,204 @@
+# python/nct_attack/compare_models.py
+# Сравнение нескольких обученных моделей (meta.json + graph.json) за один прогон
+#
+# Данные читаются один раз, шум атак FGSM генерируется один раз и одинаков для всех
+# моделей (парное сравнение), чистый инференс каждой модели считается один раз и
+# переиспользуется всеми атаками. Итог — таблица "атака x модель" с успешностью,
+# сдвигом Хэмминга, временем и числом запросов к модели.
+#
+# Метрики строк:
+#   success_rate — доля образцов со сменой решения "Свой" (для всех атак одинаково;
+#                  у строки clean не определена)
+#   own_rate     — доля образцов с решением "Свой" после атаки (у clean — до атаки)
+#   verify_calls — запросы к модели в полных вызовах VerifyImage: у clean / fgsm — по
+#                  одному на образец, у margin — вычисления нейронов / число нейронов
+
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from margins import graph_candidates, margin_attack
+from nct_model import CompiledGraph, CompiledModel, load_compiled_graph, load_compiled_model, load_feature_matrix
+
+# Порог Хэмминга для решения "Свой" (как в EvaluateNctQuality)
+DEFAULT_HAMMING_THRESHOLD = 15
+
+DEFAULT_MODELS = [
+    "vae=model/meta.json:model/graph.json",
+    "cvae=model/_cvae_meta.json:model/_cvae_graph.json",
+]
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    meta_path: str
+    graph_path: Optional[str] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> 'ModelSpec':
+        """'name=meta.json[:graph.json]' или 'meta.json[:graph.json]'"""
+        name, _, paths = spec.rpartition('=')
+        meta_path, _, graph_path = paths.partition(':')
+        return cls(name=name or Path(meta_path).stem, meta_path=meta_path, graph_path=graph_path or None)
+
+
+def _row(model: str, attack: str, h_clean: np.ndarray, h_adv: np.ndarray, hamming_threshold: int,
+         seconds: float, verify_calls: float) -> Dict:
+    n = h_clean.size
+    own_adv = h_adv < hamming_threshold
+    # успех — смена решения "Свой"; у clean сравнивать не с чем
+    success = own_adv != (h_clean < hamming_threshold)
+    return {
+        'model': model,
+        'attack': attack,
+        'total_samples': int(n),
+        'success_rate': float(success.mean()) if n and attack != 'clean' else None,
+        'own_rate': float(own_adv.mean()) if n else 0.0,
+        'avg_hamming_clean': float(h_clean.mean()) if n else 0.0,
+        'avg_hamming_adv': float(h_adv.mean()) if n else 0.0,
+        'avg_hamming_shift': float((h_adv - h_clean).mean()) if n else 0.0,
+        'seconds': seconds,
+        'verify_calls': float(verify_calls),
+    }
+
+
+def compare_models(
+    specs: Sequence[ModelSpec],
+    data_csv: str,
+    nct_index: int = 0,
+    epsilons: Sequence[float] = (0.01, 0.1),
+    margin: bool = True,
+    top_k: int = 8,
+    max_iterations: int = 100,
+    hamming_threshold: int = DEFAULT_HAMMING_THRESHOLD,
+    seed: int = 42,
+) -> List[Dict]:
+    """Прогнать один набор атак на нескольких моделях.
+
+    Args:
+        specs: модели (имя, meta.json, graph.json)
+        data_csv: CSV (id,class,split,f0..) — общий для всех моделей
+        nct_index: атакуемый NCT в каждой модели
+        epsilons: уровни шума FGSM
+        margin: запускать ли атаку по таблице запасов
+        top_k: ходов на итерацию для атаки по таблице запасов
+        max_iterations: итераций атаки по таблице запасов
+        hamming_threshold: порог решения "Свой"
+        seed: зерно шума FGSM
+
+    Returns:
+        строки таблицы (модель, атака, метрики)
+    """
+    models: Dict[str, CompiledModel] = {}
+    graphs: Dict[str, Optional[CompiledGraph]] = {}
+    for spec in specs:
+        models[spec.name] = load_compiled_model(spec.meta_path)
+        graphs[spec.name] = (load_compiled_graph(spec.graph_path, models[spec.name].feature_count)
+                             if spec.graph_path else None)
+        print(f"[*] Модель {spec.name}: {spec.meta_path}" + (f" + {spec.graph_path}" if spec.graph_path else ""))
+
+    feature_counts = {m.feature_count for m in models.values()}
+    if len(feature_counts) != 1:
+        raise ValueError(f"Модели с разным числом признаков: {sorted(feature_counts)}")
+
+    ids, _, X = load_feature_matrix(data_csv, feature_counts.pop())
+    print(f"[*] Данные: {data_csv}, {X.shape[0]} образцов")
+
+    # шум FGSM одинаков для всех моделей (как attack_fgsm: clip на 3 * epsilon)
+    rng = np.random.default_rng(seed)
+    noise = {eps: np.clip(rng.standard_normal(X.shape), -3.0, 3.0) * eps for eps in epsilons}
+
+    rows = []
+    for name, model in models.items():
+        nct = model.ncts[nct_index]
+        start = time.perf_counter()
+        h_clean = nct.hamming_batch(X)
+        clean_seconds = time.perf_counter() - start
+        rows.append(_row(name, 'clean', h_clean, h_clean, hamming_threshold, clean_seconds, X.shape[0]))
+
+        for eps, delta in noise.items():
+            start = time.perf_counter()
+            h_adv = nct.hamming_batch(X + delta)
+            rows.append(_row(name, f'fgsm@{eps:g}', h_clean, h_adv, hamming_threshold,
+                             time.perf_counter() - start, X.shape[0]))
+
+        if margin:
+            candidates = graph_candidates(graphs[name], X.shape[1]) if graphs[name] is not None else None
+            start = time.perf_counter()
+            result = margin_attack(nct, X, candidates=candidates, top_k=top_k,
+                                   max_iterations=max_iterations, hamming_threshold=hamming_threshold)
+            # образцы, уже принятые как "Свой", margin_attack не атакует: успех — только смена решения
+            rows.append(_row(name, 'margin', result.hamming_initial, result.hamming_final, hamming_threshold,
+                             time.perf_counter() - start, result.summary()['verify_equivalents']))
+
+        print(f"  [{name}] готово: {len(noise) + 1 + int(margin)} атак")
+    return rows
+
+
+def comparison_table(rows: List[Dict], metrics: Sequence[str] = (
+        'success_rate', 'own_rate', 'avg_hamming_shift', 'seconds', 'verify_calls')):
+    """Таблица атака x (метрика, модель)"""
+    import pandas as pd
+
+    frame = pd.DataFrame(rows)
+    table = frame.pivot(index='attack', columns='model', values=list(metrics))
+    # порядок атак и моделей — как в прогоне, а не по алфавиту
+    columns = pd.MultiIndex.from_product([list(metrics), frame['model'].drop_duplicates()])
+    return table.reindex(index=frame['attack'].drop_duplicates(), columns=columns)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Сравнение нескольких моделей NCT на одном наборе атак")
+    parser.add_argument("--model", type=str, nargs="+", default=DEFAULT_MODELS,
+                        help="Модели: name=meta.json[:graph.json]")
+    parser.add_argument("--data", type=str, required=True, help="CSV (id,class,split,f0..)")
+    parser.add_argument("--output-path", type=str, default="../model/comparison.json", help="Путь к отчёту")
+    parser.add_argument("--nct-index", type=int, default=0, help="Индекс атакуемого NCT")
+    parser.add_argument("--epsilon", type=float, nargs="*", default=[0.01, 0.1], help="Уровни шума FGSM")
+    parser.add_argument("--no-margin", action="store_true", help="Не запускать атаку по таблице запасов")
+    parser.add_argument("--top-k", type=int, default=8, help="Ходов на итерацию (атака по таблице запасов)")
+    parser.add_argument("--max-iterations", type=int, default=100, help="Итераций (атака по таблице запасов)")
+    parser.add_argument("--hamming-threshold", type=int, default=DEFAULT_HAMMING_THRESHOLD, help="Порог 'Свой'")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно шума FGSM")
+
+    args = parser.parse_args()
+
+    specs = [ModelSpec.parse(s) for s in args.model]
+    rows = compare_models(
+        specs,
+        args.data,
+        nct_index=args.nct_index,
+        epsilons=args.epsilon,
+        margin=not args.no_margin,
+        top_k=args.top_k,
+        max_iterations=args.max_iterations,
+        hamming_threshold=args.hamming_threshold,
+        seed=args.seed,
+    )
+
+    output_path = Path(args.output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'data': args.data,
+            'nct_index': args.nct_index,
+            'models': [vars(s) for s in specs],
+            'rows': rows,
+        }, f, indent=2)
+
+    table = comparison_table(rows)
+    table.to_csv(output_path.with_suffix('.csv'))
+
+    print("\n" + "=" * 60)
+    print(table.round(4).to_string())
+    print("success_rate — смена решения 'Свой'; own_rate — доля 'Свой' после атаки; "
+          "verify_calls — запросы в вызовах VerifyImage")
+    print("=" * 60)
+    print(f"[DONE] Отчёт: {output_path}, таблица: {output_path.with_suffix('.csv')}")
@@ -0,0 +1,193 @@
+# python/nct_attack/correlation.py
+# Потоковое (out-of-core) вычисление корреляционных матриц признаков
+#
+# Аналог Statistica.CalcCorrelationMatrix, но данные подаются блоками: для каждого
+# блока считаются среднее и матрица ко-моментов (одно матричное произведение),
+# затем блок сливается с накопленной статистикой — рекуррентно, как Mx_rct/Dx_rct,
+# только сразу для всех пар признаков (формула Чана для объединения выборок).
+
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from nct_model import DEFAULT_P, iter_feature_chunks, load_compiled_model
+
+
+class _Moments:
+    """Количество, среднее и матрица ко-моментов одной выборки"""
+
+    def __init__(self, n_features: int):
+        self.n = 0
+        self.mean = np.zeros(n_features, dtype=np.float64)
+        self.comoment = np.zeros((n_features, n_features), dtype=np.float64)
+
+    def update(self, X: np.ndarray) -> None:
+        n_b = X.shape[0]
+        if n_b == 0:
+            return
+        mean_b = X.mean(axis=0)
+        centered = X - mean_b
+        comoment_b = centered.T @ centered
+
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.comoment += comoment_b + np.outer(delta, delta) * (self.n * n_b / n)
+        self.mean += delta * (n_b / n)
+        self.n = n
+
+    def covariance(self) -> np.ndarray:
+        if self.n < 2:
+            return np.full_like(self.comoment, np.nan)
+        return self.comoment / (self.n - 1)
+
+    def correlation(self) -> np.ndarray:
+        sd = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.comoment / np.outer(sd, sd)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+
+class StreamingCorrelation:
+    """Накопитель глобальной и поклассовых корреляционных матриц.
+
+    Args:
+        n_features: число признаков
+        classes: классы, для которых копятся отдельные матрицы
+            (None — все встреченные; память O(k * n_features^2))
+        sx_stranger: если задан, признаки переводятся в мета-пространство
+            (|x| / sx)^p, как перед CalcCorrelationMatrix в NCT.Training
+        p: степенной коэффициент нормировки
+    """
+
+    def __init__(
+        self,
+        n_features: int,
+        classes: Optional[Iterable[int]] = None,
+        sx_stranger: Optional[np.ndarray] = None,
+        p: float = DEFAULT_P,
+    ):
+        self.n_features = n_features
+        self.track_classes = None if classes is None else set(int(c) for c in classes)
+        self.sx_stranger = sx_stranger
+        self.p = p
+
+        self.global_moments = _Moments(n_features)
+        self.class_moments: Dict[int, _Moments] = {}
+
+    def update(self, X: np.ndarray, classes: Optional[np.ndarray] = None) -> None:
+        """Добавить блок образов (n, n_features) с метками классов"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.sx_stranger is not None:
+            X = np.power(np.abs(X) / self.sx_stranger, self.p)
+
+        self.global_moments.update(X)
+        if classes is None:
+            return
+
+        classes = np.asarray(classes)
+        for class_id in np.unique(classes):
+            class_id = int(class_id)
+            if class_id < 0:
+                continue
+            if self.track_classes is not None and class_id not in self.track_classes:
+                continue
+            if class_id not in self.class_moments:
+                self.class_moments[class_id] = _Moments(self.n_features)
+            self.class_moments[class_id].update(X[classes == class_id])
+
+    @property
+    def n_samples(self) -> int:
+        return self.global_moments.n
+
+    def global_correlation(self) -> np.ndarray:
+        return self.global_moments.correlation()
+
+    def class_correlation(self, class_id: int) -> np.ndarray:
+        return self.class_moments[class_id].correlation()
+
+    def save(self, output_path: str) -> None:
+        """Сохранить матрицы в .npz"""
+        class_ids = sorted(self.class_moments)
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            output_path,
+            n_samples=self.n_samples,
+            global_mean=self.global_moments.mean,
+            global_corr=self.global_correlation(),
+            class_ids=np.asarray(class_ids, dtype=np.int64),
+            class_n=np.asarray([self.class_moments[c].n for c in class_ids], dtype=np.int64),
+            class_mean=np.asarray([self.class_moments[c].mean for c in class_ids]).reshape(-1, self.n_features),
+            class_corr=np.asarray([self.class_correlation(c) for c in class_ids]).reshape(
+                -1, self.n_features, self.n_features),
+        )
+        print(f"  - Корреляции сохранены в {output_path}")
+
+
+def load_correlation(correlation_path: str, class_id: Optional[int] = None) -> np.ndarray:
+    """Корреляционная матрица класса из .npz (или глобальная, если класса нет)"""
+    correlation_path = Path(correlation_path)
+    if not correlation_path.exists():
+        raise FileNotFoundError(f"File not found: {correlation_path}")
+
+    with np.load(correlation_path) as data:
+        if class_id is not None:
+            matches = np.flatnonzero(data['class_ids'] == class_id)
+            if matches.size:
+                return data['class_corr'][matches[0]]
+            print(f"[!] Класс {class_id} не найден в {correlation_path}, используется глобальная матрица")
+        return data['global_corr']
+
+
+def accumulate_correlation(
+    data_path: str,
+    feature_count: int = 512,
+    chunk_size: int = 10000,
+    classes: Optional[Iterable[int]] = None,
+    sx_stranger: Optional[np.ndarray] = None,
+) -> StreamingCorrelation:
+    """Пройти файл признаков блоками и накопить корреляции"""
+    acc = StreamingCorrelation(feature_count, classes=classes, sx_stranger=sx_stranger)
+    for _, chunk_classes, X in iter_feature_chunks(data_path, chunk_size, feature_count):
+        acc.update(X, chunk_classes)
+        print(f"  Processed {acc.n_samples} samples")
+
+    print(f"[DONE] Корреляции накоплены:")
+    print(f"  - Образцов: {acc.n_samples}")
+    print(f"  - Классов: {len(acc.class_moments)}")
+    return acc
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Потоковое вычисление корреляционных матриц")
+    parser.add_argument("--data", type=str, required=True, help="CSV (id,class,split,f0..) или .npy с признаками")
+    parser.add_argument("--output-path", type=str, default="../model/correlation.npz", help="Путь к .npz")
+    parser.add_argument("--feature-count", type=int, default=512, help="Количество признаков")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Образцов в блоке")
+    parser.add_argument("--classes", type=int, nargs="*", default=None, help="Классы для поклассовых матриц")
+    parser.add_argument(
+        "--meta-path",
+        type=str,
+        default=None,
+        help="meta.json: нормировать признаки по sx_stranger выбранного NCT"
+    )
+    parser.add_argument("--nct-index", type=int, default=0, help="Индекс NCT для нормировки")
+
+    args = parser.parse_args()
+
+    sx_stranger = None
+    if args.meta_path:
+        sx_stranger = load_compiled_model(args.meta_path).ncts[args.nct_index].sx_stranger
+
+    acc = accumulate_correlation(
+        args.data,
+        feature_count=args.feature_count,
+        chunk_size=args.chunk_size,
+        classes=args.classes,
+        sx_stranger=sx_stranger,
+    )
+    acc.save(args.output_path)
@@ -0,0 +1,253 @@
+# python/nct_attack/error_rates.py
+# Монте-Карло оценка BER / FRR / FAR обученных NCT с доверительными интервалами
+#
+# Для каждого NCT из meta.json генерируются зашумлённые образы "Свой" (класс = индекс NCT)
+# и "Чужой" (классы >= own_classes, как при обучении в NctCli.RunTrain), коды считаются
+# пакетно (CompiledNCT.verify_batch), накапливаются:
+#   - число ошибок по каждому биту кода на образах "Свой" (BER),
+#   - гистограммы расстояний Хэмминга для "Свой" и "Чужой",
+#   - FRR(t) = P(h_own >= t) и FAR(t) = P(h_stranger < t) для всех порогов t.
+# Задачи (NCT x порция испытаний) распределяются по процессам; модель и данные
+# разделяются через shared memory (shared_store.py).
+
+import json
+import math
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared_store import SharedModelStore, attach, init_worker, worker_view
+
+# Порог Хэмминга для решения "Свой" (как в EvaluateNctQuality)
+DEFAULT_HAMMING_THRESHOLD = 15
+
+
+def wilson_interval(errors: np.ndarray, n: int, z: float = 1.96) -> Tuple[np.ndarray, np.ndarray]:
+    """Доверительный интервал Уилсона для доли errors / n (корректен и при 0 ошибок)"""
+    errors = np.asarray(errors, dtype=np.float64)
+    if n == 0:
+        return np.zeros_like(errors), np.ones_like(errors)
+    p = errors / n
+    denom = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return np.clip(center - half, 0.0, 1.0), np.clip(center + half, 0.0, 1.0)
+
+
+def _draw(rng: np.random.Generator, base: np.ndarray, sd: np.ndarray, noise_scale: float, n: int) -> np.ndarray:
+    rows = base[rng.integers(0, base.shape[0], size=n)]
+    return rows + rng.standard_normal(rows.shape) * (sd * noise_scale)
+
+
+def _simulate(task: Tuple[int, int, int, float, int, np.random.SeedSequence]) -> Dict:
+    """Одна порция испытаний одного NCT (выполняется в рабочем процессе)"""
+    nct_index, n_own, n_stranger, noise_scale, chunk_size, seed = task
+    view = worker_view()
+    nct = view.model.ncts[nct_index]
+    rng = np.random.default_rng(seed)
+
+    # при отсутствии образов класса число испытаний обнуляется в estimate_error_rates
+    own = view.X[view.classes == nct_index]
+    strangers = view.X[view.classes >= view.model.own_classes]
+    stranger_sd = strangers.std(axis=0) if strangers.shape[0] > 1 else np.zeros(view.X.shape[1])
+    own_sd = own.std(axis=0) if own.shape[0] > 1 else stranger_sd
+
+    n_bits = min(2 * nct.n_neurons, nct.key_bits.shape[0])
+    bit_errors = np.zeros(n_bits, dtype=np.int64)
+    hist_own = np.zeros(n_bits + 1, dtype=np.int64)
+    hist_stranger = np.zeros(n_bits + 1, dtype=np.int64)
+
+    for start in range(0, n_own, chunk_size):
+        n = min(chunk_size, n_own - start)
+        codes = nct.verify_batch(_draw(rng, own, own_sd, noise_scale, n))[:, :n_bits]
+        errors = codes != nct.key_bits[:n_bits]
+        bit_errors += errors.sum(axis=0)
+        hist_own += np.bincount(errors.sum(axis=1), minlength=n_bits + 1)
+
+    for start in range(0, n_stranger, chunk_size):
+        n = min(chunk_size, n_stranger - start)
+        hamming = nct.hamming_batch(_draw(rng, strangers, stranger_sd, noise_scale, n))
+        hist_stranger += np.bincount(hamming, minlength=n_bits + 1)
+
+    return {
+        'nct_index': nct_index,
+        'bit_errors': bit_errors,
+        'hist_own': hist_own,
+        'hist_stranger': hist_stranger,
+    }
+
+
+def _report(nct_index: int, bit_errors: np.ndarray, hist_own: np.ndarray, hist_stranger: np.ndarray,
+            threshold: int, z: float) -> Dict:
+    """Отчёт по NCT; оценки без испытаний (n = 0) — None, а не 0"""
+    n_own = int(hist_own.sum())
+    n_stranger = int(hist_stranger.sum())
+    thresholds = np.arange(hist_own.size + 1)
+    t = min(threshold, thresholds[-1])
+
+    # FRR(t): h_own >= t отвергается; FAR(t): h_stranger < t принимается
+    frr_errors = n_own - np.concatenate([[0], np.cumsum(hist_own)])
+    far_errors = np.concatenate([[0], np.cumsum(hist_stranger)])
+    frr = frr_errors / n_own if n_own else None
+    far = far_errors / n_stranger if n_stranger else None
+    frr_lo, frr_hi = wilson_interval(frr_errors, n_own, z)
+    far_lo, far_hi = wilson_interval(far_errors, n_stranger, z)
+    ber_lo, ber_hi = wilson_interval(bit_errors, n_own, z)
+
+    eer_index = int(np.argmin(np.abs(far - frr))) if n_own and n_stranger else None
+
+    return {
+        'nct_index': nct_index,
+        'n_own': n_own,
+        'n_stranger': n_stranger,
+        'threshold': int(t),
+        'frr': float(frr[t]) if n_own else None,
+        'frr_ci': [float(frr_lo[t]), float(frr_hi[t])] if n_own else None,
+        'far': float(far[t]) if n_stranger else None,
+        'far_ci': [float(far_lo[t]), float(far_hi[t])] if n_stranger else None,
+        'eer_threshold': int(thresholds[eer_index]) if eer_index is not None else None,
+        'eer': float((far[eer_index] + frr[eer_index]) / 2) if eer_index is not None else None,
+        'ber_mean': float(bit_errors.sum() / (n_own * bit_errors.size)) if n_own and bit_errors.size else None,
+        'ber_max': float(bit_errors.max() / n_own) if n_own and bit_errors.size else None,
+        'ber': (bit_errors / n_own).tolist() if n_own else None,
+        'ber_ci_high': ber_hi.tolist() if n_own else None,
+        'hamming_hist_own': hist_own.tolist(),
+        'hamming_hist_stranger': hist_stranger.tolist(),
+        'curve': {
+            'thresholds': thresholds.tolist(),
+            'frr': frr.tolist() if n_own else None,
+            'frr_ci_low': frr_lo.tolist() if n_own else None,
+            'frr_ci_high': frr_hi.tolist() if n_own else None,
+            'far': far.tolist() if n_stranger else None,
+            'far_ci_low': far_lo.tolist() if n_stranger else None,
+            'far_ci_high': far_hi.tolist() if n_stranger else None,
+        },
+    }
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.2e}"
+
+
+def estimate_error_rates(
+    meta_path: str,
+    data_csv: str,
+    n_own: int = 100_000,
+    n_stranger: int = 100_000,
+    noise_scale: float = 0.25,
+    nct_indices: Optional[List[int]] = None,
+    workers: Optional[int] = None,
+    task_size: int = 50_000,
+    chunk_size: int = 10_000,
+    threshold: int = DEFAULT_HAMMING_THRESHOLD,
+    z: float = 1.96,
+    seed: int = 42,
+) -> List[Dict]:
+    """Оценить BER / FRR / FAR для NCT модели.
+
+    Args:
+        meta_path: путь к meta.json
+        data_csv: CSV (id,class,split,f0..) с образами всех классов
+        n_own: испытаний "Свой" на NCT
+        n_stranger: испытаний "Чужой" на NCT
+        noise_scale: шум = noise_scale * СКО признака в своём классе / у "Чужих"
+        nct_indices: какие NCT оценивать (None — все)
+        workers: число процессов (None — по числу ядер)
+        task_size: испытаний одного вида в одной задаче пула
+        chunk_size: образов в одном пакете verify_batch
+        threshold: порог решения "Свой" для итоговых FAR/FRR
+        z: квантиль доверительного интервала (1.96 — 95%)
+        seed: зерно генератора
+
+    Returns:
+        список отчётов по NCT
+    """
+    with SharedModelStore(meta_path, data_csv=data_csv) as store:
+        handle = store.handle
+        if nct_indices is None:
+            nct_indices = list(range(handle.nct_count))
+
+        # наличие образов "Свой" / "Чужой" проверяется один раз на NCT, а не в каждой задаче
+        view = attach(handle)
+        own_classes = view.model.own_classes
+        has_own = {i: bool((view.classes == i).any()) for i in nct_indices}
+        has_stranger = bool((view.classes >= own_classes).any())
+        view.close()
+        if not has_stranger:
+            print(f"[!] Нет образов 'Чужой' (классы >= {own_classes}): FAR и EER не оцениваются")
+        for nct_index in nct_indices:
+            if not has_own[nct_index]:
+                print(f"[!] NCT {nct_index}: нет образов класса {nct_index}, FRR и BER не оцениваются")
+
+        # каждая задача получает независимый поток случайных чисел
+        n_tasks = max(1, math.ceil(max(n_own, n_stranger) / task_size))
+        seeds = iter(np.random.SeedSequence(seed).spawn(n_tasks * len(nct_indices)))
+        tasks = []
+        for nct_index in nct_indices:
+            for k in range(n_tasks):
+                own_part = n_own // n_tasks + (1 if k < n_own % n_tasks else 0)
+                stranger_part = n_stranger // n_tasks + (1 if k < n_stranger % n_tasks else 0)
+                own_part = own_part if has_own[nct_index] else 0
+                stranger_part = stranger_part if has_stranger else 0
+                tasks.append((nct_index, own_part, stranger_part, noise_scale, chunk_size, next(seeds)))
+
+        print(f"[*] Monte-Carlo: {len(nct_indices)} NCT, {len(tasks)} задач, "
+              f"{n_own} своих + {n_stranger} чужих испытаний на NCT")
+
+        totals: Dict[int, Dict[str, np.ndarray]] = {}
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(handle,)) as pool:
+            for part in pool.imap_unordered(_simulate, tasks):
+                acc = totals.setdefault(part.pop('nct_index'), {})
+                for name, arr in part.items():
+                    acc[name] = acc[name] + arr if name in acc else arr
+
+    reports = []
+    for nct_index in nct_indices:
+        acc = totals[nct_index]
+        report = _report(nct_index, acc['bit_errors'], acc['hist_own'], acc['hist_stranger'], threshold, z)
+        reports.append(report)
+        frr_ci = report['frr_ci'] or [None, None]
+        far_ci = report['far_ci'] or [None, None]
+        print(f"  [NCT {nct_index}] FRR@{report['threshold']} = {_fmt(report['frr'])} "
+              f"[{_fmt(frr_ci[0])}, {_fmt(frr_ci[1])}], "
+              f"FAR = {_fmt(report['far'])} [{_fmt(far_ci[0])}, {_fmt(far_ci[1])}], "
+              f"EER = {_fmt(report['eer'])} (t={report['eer_threshold']}), BER = {_fmt(report['ber_mean'])}")
+    return reports
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Монте-Карло оценка BER / FRR / FAR для NCT")
+    parser.add_argument("--meta-path", type=str, default="../model/meta.json", help="Путь к meta.json")
+    parser.add_argument("--data", type=str, required=True, help="CSV (id,class,split,f0..) со всеми классами")
+    parser.add_argument("--output-path", type=str, default="../model/error_rates.json", help="Путь к отчёту")
+    parser.add_argument("--n-own", type=int, default=100_000, help="Испытаний 'Свой' на NCT")
+    parser.add_argument("--n-stranger", type=int, default=100_000, help="Испытаний 'Чужой' на NCT")
+    parser.add_argument("--noise-scale", type=float, default=0.25, help="Шум в долях СКО признака")
+    parser.add_argument("--nct-index", type=int, nargs="*", default=None, help="Индексы NCT (по умолчанию все)")
+    parser.add_argument("--workers", type=int, default=None, help="Количество процессов")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_HAMMING_THRESHOLD, help="Порог решения 'Свой'")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора")
+
+    args = parser.parse_args()
+
+    reports = estimate_error_rates(
+        args.meta_path,
+        args.data,
+        n_own=args.n_own,
+        n_stranger=args.n_stranger,
+        noise_scale=args.noise_scale,
+        nct_indices=args.nct_index,
+        workers=args.workers,
+        threshold=args.threshold,
+        seed=args.seed,
+    )
+
+    output_path = Path(args.output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'meta_path': args.meta_path, 'noise_scale': args.noise_scale, 'ncts': reports}, f, indent=2)
+    print(f"[DONE] Отчёт сохранён в {output_path}")
@@ -0,0 +1,393 @@
+# python/nct_attack/margins.py
+# Таблица запасов нейронов и атака по кандидатам без зондирования
+#
+# Для каждого образца хранится отклик каждого нейрона y, знаковое расстояние до
+# ближайшего порога, требуемое изменение отклика dy до интервала, чьи биты совпадают
+# с ключом, и аналитические производные dy/dx по признакам синапсов. По ним признаки
+# ранжируются по "стоимости" |dy| / |dy/dx_f| — сколько единиц изменения признака нужно,
+# чтобы перевести несовпадающий нейрон в нужный интервал.
+#
+# Атака проверяет только top_k кандидатов на итерацию, причём точно: пересчитываются
+# только нейроны, в синапсы которых входит изменённый признак (обычно единицы из сотен).
+# После принятого шага таблица обновляется для тех же нейронов.
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from nct_model import DEFAULT_P, TABLES_PATTERNS, CompiledGraph, CompiledNCT
+
+# Порог Хэмминга для решения "Свой" (как в EvaluateNctQuality)
+DEFAULT_HAMMING_THRESHOLD = 15
+
+
+def _feature_neurons(nct: CompiledNCT) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR: признак -> нейроны, в синапсы которых он входит"""
+    pairs = np.unique(np.stack([
+        np.repeat(np.arange(nct.n_neurons), nct.synapses.shape[1] * 2),
+        nct.synapses.reshape(nct.n_neurons, -1).ravel(),
+    ], axis=1), axis=0)
+    order = np.argsort(pairs[:, 1], kind='stable')
+    neurons, features = pairs[order, 0], pairs[order, 1]
+    indptr = np.zeros(nct.n_features + 1, dtype=np.int64)
+    np.add.at(indptr, features + 1, 1)
+    return np.cumsum(indptr), neurons.astype(np.int32)
+
+
+def _accepted_intervals(nct: CompiledNCT) -> np.ndarray:
+    """(n_neurons, 4) bool — интервалы, биты которых совпадают с ключом"""
+    n_bits = min(2 * nct.n_neurons, nct.key_bits.shape[0])
+    compared = (np.arange(2 * nct.n_neurons) < n_bits).reshape(nct.n_neurons, 2)
+    key = np.zeros(2 * nct.n_neurons, dtype=bool)
+    key[:n_bits] = nct.key_bits[:n_bits]
+    patterns = TABLES_PATTERNS[nct.table_indices]              # (n_neurons, 4, 2)
+    mismatch = (patterns != key.reshape(-1, 1, 2)) & compared[:, None, :]
+    return ~mismatch.any(axis=2)
+
+
+class MarginTable:
+    """Таблица запасов нейронов для пакета образцов.
+
+    Args:
+        nct: атакуемый NCT
+        X: образцы (n, n_features); копируются, таблица ведёт их текущее состояние
+        p: степенной коэффициент нормировки
+    """
+
+    def __init__(self, nct: CompiledNCT, X: np.ndarray, p: float = DEFAULT_P):
+        self.nct = nct
+        self.p = p
+        self.X = np.array(X, dtype=np.float64, copy=True)
+        self.Xn = nct.normalize(self.X, p)
+        self.feature_indptr, self.feature_neuron_ids = _feature_neurons(nct)
+        self.accepted = _accepted_intervals(nct)
+
+        n, n_neurons = self.X.shape[0], nct.n_neurons
+        n_inputs = nct.synapses.shape[1]
+        self.outputs = np.zeros((n, n_neurons))
+        self.intervals = np.zeros((n, n_neurons), dtype=np.int8)
+        self.boundary_distance = np.zeros((n, n_neurons))   # y - ближайший порог
+        self.target_delta = np.zeros((n, n_neurons))        # dy до интервала ключа (0 — биты совпадают)
+        self.mismatched_bits = np.zeros((n, n_neurons), dtype=np.int8)
+        self.grad = np.zeros((n, n_neurons, n_inputs, 2))   # dy/dx по признакам синапсов (j, t)
+
+        rows = np.repeat(np.arange(n), n_neurons)
+        neurons = np.tile(np.arange(n_neurons), n)
+        self._refresh(rows, neurons)
+        self.hamming = self.mismatched_bits.sum(axis=1).astype(np.int64)
+        self.neuron_evaluations = rows.size
+
+    # ---------- пересчёт ----------
+
+    def _evaluate(self, rows: np.ndarray, neurons: np.ndarray,
+                  Xn_pairs: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Отклики и производные для пар (образец, нейрон) -> (y (m,), grad (m, n_inputs, 2))"""
+        syn = self.nct.synapses[neurons]                     # (m, n_inputs, 2)
+        if Xn_pairs is None:
+            Xn_pairs = self.Xn[rows[:, None, None], syn]
+        w = self.nct.weights[neurons]
+        diff = Xn_pairs[..., 0] - Xn_pairs[..., 1]
+        m = np.abs(diff)
+        dev = m - m.mean(axis=1, keepdims=True)
+        y = np.sqrt((dev ** 2 * w).mean(axis=1))
+
+        # d y / d m_k = (w_k dev_k - mean_i(w_i dev_i)) / (K y)
+        wd = w * dev
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dy_dm = (wd - wd.mean(axis=1, keepdims=True)) / (m.shape[1] * y[:, None])
+        dy_dm = np.nan_to_num(dy_dm, nan=0.0, posinf=0.0, neginf=0.0) * np.sign(diff)
+
+        # d xn / d x = p * xn / x
+        x = self.X[rows[:, None, None], syn]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dxn_dx = np.where(x != 0.0, self.p * Xn_pairs / x, 0.0)
+        grad = np.stack([dy_dm, -dy_dm], axis=-1) * dxn_dx
+        return y, grad
+
+    def _classify(self, neurons: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Интервал, расстояние до порога, dy до интервала ключа и число несовпадающих бит"""
+        t = self.nct.thresholds[neurons]
+        interval = (y[:, None] >= t).sum(axis=1).astype(np.int8)
+        to_threshold = y[:, None] - t
+        boundary = to_threshold[np.arange(y.size), np.abs(to_threshold).argmin(axis=1)]
+
+        lo = np.concatenate([np.full((y.size, 1), -np.inf), t], axis=1)
+        hi = np.concatenate([t, np.full((y.size, 1), np.inf)], axis=1)
+        to_interval = np.where(y[:, None] < lo, lo - y[:, None], np.where(y[:, None] >= hi, hi - y[:, None], 0.0))
+        to_interval = np.where(self.accepted[neurons], to_interval, np.inf)
+        target = to_interval[np.arange(y.size), np.abs(to_interval).argmin(axis=1)]
+
+        bits = TABLES_PATTERNS[self.nct.table_indices[neurons], interval]
+        key_bits = np.zeros((y.size, 2), dtype=bool)
+        compared = np.zeros((y.size, 2), dtype=bool)
+        n_bits = self.nct.key_bits.shape[0]
+        for b in range(2):
+            pos = 2 * neurons + b
+            compared[:, b] = pos < n_bits
+            key_bits[:, b] = self.nct.key_bits[np.minimum(pos, n_bits - 1)]
+        mismatched = ((bits != key_bits) & compared).sum(axis=1).astype(np.int8)
+        return interval, boundary, target, mismatched
+
+    def _refresh(self, rows: np.ndarray, neurons: np.ndarray) -> None:
+        y, grad = self._evaluate(rows, neurons)
+        interval, boundary, target, mismatched = self._classify(neurons, y)
+        self.outputs[rows, neurons] = y
+        self.grad[rows, neurons] = grad
+        self.intervals[rows, neurons] = interval
+        self.boundary_distance[rows, neurons] = boundary
+        self.target_delta[rows, neurons] = target
+        self.mismatched_bits[rows, neurons] = mismatched
+
+    def _expand(self, rows: np.ndarray, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Пары (индекс изменения, нейрон) для всех нейронов, затронутых признаками"""
+        starts = self.feature_indptr[features]
+        counts = self.feature_indptr[features + 1] - starts
+        owner = np.repeat(np.arange(rows.size), counts)
+        offsets = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner, rows[owner], self.feature_neuron_ids[np.repeat(starts, counts) + offsets]
+
+    # ---------- кандидаты ----------
+
+    def rank_candidates(self, rows: np.ndarray, candidates: Optional[np.ndarray] = None,
+                        max_step: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Кандидаты (признак, изменение) по возрастанию стоимости для каждого образца.
+
+        Для каждого несовпадающего нейрона и признака его синапсов линейная оценка
+        dx = target_delta / (dy/dx); стоимость — |dx| в единицах sx_stranger признака.
+
+        Returns:
+            features (r, c), dx (r, c), cost (r, c); c = n_neurons * n_inputs * 2, inf — не кандидат
+        """
+        syn = np.broadcast_to(self.nct.synapses, (rows.size,) + self.nct.synapses.shape)
+        grad = self.grad[rows]
+        target = self.target_delta[rows][..., None, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dx = target / grad
+        dx = np.where(np.isfinite(dx) & (target != 0.0), dx, np.inf)
+        cost = np.abs(dx) / self.nct.sx_stranger[syn]
+        if candidates is not None:
+            cost = np.where(candidates[syn], cost, np.inf)
+        if max_step is not None:
+            cost = np.where(cost <= max_step, cost, np.inf)
+
+        features = syn.reshape(rows.size, -1)
+        dx = dx.reshape(rows.size, -1)
+        cost = cost.reshape(rows.size, -1)
+        order = np.argsort(cost, axis=1, kind='stable')
+        return (np.take_along_axis(features, order, axis=1),
+                np.take_along_axis(dx, order, axis=1),
+                np.take_along_axis(cost, order, axis=1))
+
+    def evaluate_moves(self, rows: np.ndarray, features: np.ndarray, dx: np.ndarray) -> np.ndarray:
+        """Точное изменение Хэмминга для ходов x[row, feature] += dx без полного VerifyImage"""
+        owner, pair_rows, neurons = self._expand(rows, features)
+        syn = self.nct.synapses[neurons]
+        Xn_pairs = self.Xn[pair_rows[:, None, None], syn]
+        new_x = self.X[rows, features] + dx
+        new_xn = np.power(np.abs(new_x) / self.nct.sx_stranger[features], self.p)
+        Xn_pairs = np.where(syn == features[owner][:, None, None], new_xn[owner][:, None, None], Xn_pairs)
+
+        y, _ = self._evaluate(pair_rows, neurons, Xn_pairs)
+        _, _, _, mismatched = self._classify(neurons, y)
+        self.neuron_evaluations += neurons.size
+        change = mismatched.astype(np.int64) - self.mismatched_bits[pair_rows, neurons]
+        return np.bincount(owner, weights=change, minlength=rows.size).astype(np.int64)
+
+    def apply_moves(self, rows: np.ndarray, features: np.ndarray, dx: np.ndarray) -> None:
+        """Принять ходы и обновить таблицу только для затронутых нейронов"""
+        self.X[rows, features] += dx
+        self.Xn[rows, features] = np.power(np.abs(self.X[rows, features]) / self.nct.sx_stranger[features], self.p)
+        _, pair_rows, neurons = self._expand(rows, features)
+        old = self.mismatched_bits[pair_rows, neurons].astype(np.int64)
+        self._refresh(pair_rows, neurons)
+        self.neuron_evaluations += neurons.size
+        np.add.at(self.hamming, pair_rows, self.mismatched_bits[pair_rows, neurons] - old)
+
+    def save(self, output_path: str) -> None:
+        """Сохранить таблицу в .npz"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            output_path,
+            nct_index=self.nct.index,
+            outputs=self.outputs,
+            intervals=self.intervals,
+            boundary_distance=self.boundary_distance,
+            target_delta=self.target_delta,
+            mismatched_bits=self.mismatched_bits,
+            hamming=self.hamming,
+        )
+        print(f"  - Таблица запасов сохранена в {output_path}")
+
+
+def graph_candidates(graph: CompiledGraph, n_features: int) -> np.ndarray:
+    """Маска признаков, которые трогает графовая атака: партнёры родительских признаков"""
+    mask = np.zeros(n_features, dtype=bool)
+    for parent in graph.parent_ids:
+        mask[graph.partners(int(parent))[0]] = True
+    return mask
+
+
+@dataclass
+class MarginAttackResult:
+    X_adv: np.ndarray
+    hamming_initial: np.ndarray
+    hamming_final: np.ndarray
+    iterations: np.ndarray
+    neuron_evaluations: int
+    n_neurons: int
+    hamming_threshold: int
+
+    def summary(self) -> Dict[str, float]:
+        n = self.hamming_initial.size
+        return {
+            'total_samples': int(n),
+            'success_rate': float((self.hamming_final < self.hamming_threshold).mean()) if n else 0.0,
+            'avg_hamming_initial': float(self.hamming_initial.mean()) if n else 0.0,
+            'avg_hamming_final': float(self.hamming_final.mean()) if n else 0.0,
+            'avg_improvement': float((self.hamming_initial - self.hamming_final).mean()) if n else 0.0,
+            'avg_iterations': float(self.iterations.mean()) if n else 0.0,
+            'neuron_evaluations': int(self.neuron_evaluations),
+            # в пересчёте на полные вызовы VerifyImage
+            'verify_equivalents': self.neuron_evaluations / self.n_neurons,
+        }
+
+
+def margin_attack(
+    nct: CompiledNCT,
+    X: np.ndarray,
+    candidates: Optional[np.ndarray] = None,
+    top_k: int = 8,
+    max_iterations: int = 100,
+    overshoot: float = 1.05,
+    max_step: Optional[float] = 1.0,
+    hamming_threshold: int = DEFAULT_HAMMING_THRESHOLD,
+    p: float = DEFAULT_P,
+) -> MarginAttackResult:
+    """Атака по таблице запасов: на итерации проверяются top_k самых дешёвых ходов.
+
+    Args:
+        nct: атакуемый NCT
+        X: образцы (n, n_features)
+        candidates: маска допустимых признаков (например, graph_candidates); None — все
+        top_k: ходов на образец за итерацию
+        max_iterations: максимум итераций
+        overshoot: множитель линейной оценки dx (запас, чтобы пересечь порог)
+        max_step: максимальный |dx| в единицах sx_stranger признака (None — без ограничения)
+        hamming_threshold: успех — Хэмминг < порога
+        p: степенной коэффициент нормировки
+
+    Returns:
+        MarginAttackResult
+    """
+    table = MarginTable(nct, X, p)
+    hamming_initial = table.hamming.copy()
+    n = table.X.shape[0]
+    iterations = np.zeros(n, dtype=np.int64)
+    offset = np.zeros(n, dtype=np.int64)   # сдвиг по списку кандидатов после неудачных итераций
+    active = np.flatnonzero(table.hamming >= hamming_threshold)
+
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+        features, dx, cost = table.rank_candidates(active, candidates, max_step)
+        cols = offset[active, None] + np.arange(top_k)
+        valid = cols < cost.shape[1]
+        cols = np.minimum(cols, cost.shape[1] - 1)
+        features = np.take_along_axis(features, cols, axis=1)
+        dx = np.take_along_axis(dx, cols, axis=1) * overshoot
+        valid &= np.isfinite(np.take_along_axis(cost, cols, axis=1))
+
+        # кандидаты кончились — образец снимается
+        exhausted = ~valid.any(axis=1)
+        rows = np.repeat(active, top_k)[valid.ravel()]
+        change = np.full(valid.shape, np.iinfo(np.int64).max)
+        change[valid] = table.evaluate_moves(rows, features[valid], dx[valid])
+
+        best = change.argmin(axis=1)
+        best_change = change[np.arange(active.size), best]
+        improved = (best_change < 0) & ~exhausted
+        iterations[active] += 1
+
+        accept = active[improved]
+        table.apply_moves(accept, features[improved, best[improved]], dx[improved, best[improved]])
+        offset[accept] = 0
+        offset[active[~improved]] += top_k
+
+        active = active[~exhausted & (table.hamming[active] >= hamming_threshold)]
+
+    return MarginAttackResult(
+        X_adv=table.X,
+        hamming_initial=hamming_initial,
+        hamming_final=table.hamming.copy(),
+        iterations=iterations,
+        neuron_evaluations=table.neuron_evaluations,
+        n_neurons=nct.n_neurons,
+        hamming_threshold=hamming_threshold,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from nct_model import load_compiled_graph, load_compiled_model, load_feature_matrix
+
+    parser = argparse.ArgumentParser(description="Таблица запасов нейронов и атака по кандидатам")
+    parser.add_argument("--meta-path", type=str, default="../model/meta.json", help="Путь к meta.json")
+    parser.add_argument("--graph-path", type=str, default=None, help="graph.json: ограничить признаки партнёрами")
+    parser.add_argument("--data", type=str, required=True, help="CSV (id,class,split,f0..)")
+    parser.add_argument("--output-path", type=str, default="../model/margin_attack.json", help="Путь к отчёту")
+    parser.add_argument("--table-path", type=str, default=None, help="Сохранить исходную таблицу запасов (.npz)")
+    parser.add_argument("--nct-index", type=int, default=0, help="Индекс атакуемого NCT")
+    parser.add_argument("--top-k", type=int, default=8, help="Ходов на образец за итерацию")
+    parser.add_argument("--max-iterations", type=int, default=100, help="Максимум итераций")
+    parser.add_argument("--max-step", type=float, default=1.0, help="Макс. |dx| в единицах sx_stranger")
+    parser.add_argument("--hamming-threshold", type=int, default=DEFAULT_HAMMING_THRESHOLD, help="Порог успеха")
+
+    args = parser.parse_args()
+
+    model = load_compiled_model(args.meta_path)
+    nct = model.ncts[args.nct_index]
+    ids, _, X = load_feature_matrix(args.data, model.feature_count)
+
+    if args.table_path:
+        MarginTable(nct, X).save(args.table_path)
+
+    candidates = None
+    if args.graph_path:
+        candidates = graph_candidates(load_compiled_graph(args.graph_path, model.feature_count), model.feature_count)
+        print(f"[*] Признаков-кандидатов из графа: {int(candidates.sum())}")
+
+    result = margin_attack(
+        nct,
+        X,
+        candidates=candidates,
+        top_k=args.top_k,
+        max_iterations=args.max_iterations,
+        max_step=args.max_step,
+        hamming_threshold=args.hamming_threshold,
+    )
+    summary = result.summary()
+
+    output_path = Path(args.output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta_path': args.meta_path,
+            'nct_index': args.nct_index,
+            'summary': summary,
+            'samples': [
+                {'id': int(i), 'hamming_initial': int(h0), 'hamming_final': int(h1), 'iterations': int(it)}
+                for i, h0, h1, it in zip(ids, result.hamming_initial, result.hamming_final, result.iterations)
+            ],
+        }, f, indent=2)
+
+    print(f"[DONE] Атака по таблице запасов:")
+    print(f"  - Средний Хэмминг: {summary['avg_hamming_initial']:.2f} -> {summary['avg_hamming_final']:.2f}")
+    print(f"  - Успешность (Хэмминг < {args.hamming_threshold}): {summary['success_rate']:.2%}")
+    print(f"  - Вычислений нейронов: {summary['neuron_evaluations']} "
+          f"(~{summary['verify_equivalents']:.0f} VerifyImage)")
+    print(f"  - Отчёт: {output_path}")
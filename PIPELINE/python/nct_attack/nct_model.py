@@ -0,0 +1,309 @@
+# python/nct_attack/nct_model.py
+# Компиляция meta.json / graph.json в плотные массивы NumPy и пакетный VerifyImage
+
+import csv
+import json
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# Степенной коэффициент перехода в мета-пространство Байеса-Минковского (как в NCT.VerifyImage)
+DEFAULT_P = 0.9
+
+# ТАБЛИЦЫ ПРЕОБРАЗОВАНИЙ откликов нейрона в бинарный код (копия NCT._tables_patterns)
+TABLES_PATTERNS = np.array([
+    [[1, 1], [0, 0], [1, 0], [0, 1]],
+    [[1, 1], [1, 0], [0, 0], [0, 1]],
+    [[0, 0], [1, 1], [1, 0], [0, 1]],
+    [[0, 0], [1, 0], [1, 1], [0, 1]],
+    [[1, 0], [0, 0], [1, 1], [0, 1]],
+    [[1, 0], [1, 1], [0, 0], [0, 1]],
+    [[0, 1], [0, 0], [1, 0], [1, 1]],
+    [[0, 1], [1, 0], [0, 0], [1, 1]],
+    [[0, 0], [0, 1], [1, 0], [1, 1]],
+    [[0, 0], [1, 0], [0, 1], [1, 1]],
+    [[1, 0], [0, 0], [0, 1], [1, 1]],
+    [[1, 0], [0, 1], [0, 0], [1, 1]],
+    [[1, 1], [0, 1], [1, 0], [0, 0]],
+    [[1, 1], [1, 0], [0, 1], [0, 0]],
+    [[0, 1], [1, 1], [1, 0], [0, 0]],
+    [[0, 1], [1, 0], [1, 1], [0, 0]],
+    [[1, 0], [0, 1], [1, 1], [0, 0]],
+    [[1, 0], [1, 1], [0, 1], [0, 0]],
+    [[1, 1], [0, 0], [0, 1], [1, 0]],
+    [[1, 1], [0, 1], [0, 0], [1, 0]],
+    [[0, 0], [1, 1], [0, 1], [1, 0]],
+    [[0, 0], [0, 1], [1, 1], [1, 0]],
+    [[0, 1], [0, 0], [1, 1], [1, 0]],
+    [[0, 1], [1, 1], [0, 0], [1, 0]],
+], dtype=bool)
+
+
+@dataclass
+class CompiledNCT:
+    """Параметры одного обученного NCT в виде плотных массивов"""
+    index: int
+    synapses: np.ndarray        # (n_neurons, n_inputs, 2) int32 — пары (j, t)
+    weights: np.ndarray         # (n_neurons, n_inputs) float64
+    thresholds: np.ndarray      # (n_neurons, 3) float64
+    table_indices: np.ndarray   # (n_neurons,) int32
+    sx_stranger: np.ndarray     # (n_features,) float64
+    key_bits: np.ndarray        # (>= 2 * n_neurons,) bool
+
+    @property
+    def n_neurons(self) -> int:
+        return self.synapses.shape[0]
+
+    @property
+    def n_features(self) -> int:
+        return self.sx_stranger.shape[0]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'synapses': self.synapses,
+            'weights': self.weights,
+            'thresholds': self.thresholds,
+            'table_indices': self.table_indices,
+            'sx_stranger': self.sx_stranger,
+            'key_bits': self.key_bits,
+        }
+
+    # ---------- инференс ----------
+
+    def normalize(self, X: np.ndarray, p: float = DEFAULT_P) -> np.ndarray:
+        """GetVectorOfNormalizedFeaturesValues для пакета образов (n, n_features)"""
+        return np.power(np.abs(X) / self.sx_stranger, p)
+
+    def neuron_outputs(self, X: np.ndarray, p: float = DEFAULT_P) -> np.ndarray:
+        """Отклики всех нейронов (n, n_neurons) — векторный GetNeuronOutput"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        Xn = self.normalize(X, p)
+        # (n, n_neurons, n_inputs)
+        meta = np.abs(Xn[:, self.synapses[..., 0]] - Xn[:, self.synapses[..., 1]])
+        my = meta.mean(axis=2, keepdims=True)
+        return np.sqrt(((meta - my) ** 2 * self.weights).mean(axis=2))
+
+    def intervals(self, y: np.ndarray) -> np.ndarray:
+        """Номер интервала отклика (0..3) по порогам — как GetNeuronActivation"""
+        t = self.thresholds
+        return np.where(y < t[:, 0], 0,
+               np.where(y < t[:, 1], 1,
+               np.where(y < t[:, 2], 2, 3))).astype(np.int8)
+
+    def codes_from_outputs(self, y: np.ndarray) -> np.ndarray:
+        """Бинарные коды (n, 2 * n_neurons) по откликам нейронов"""
+        bits = TABLES_PATTERNS[self.table_indices, self.intervals(y)]
+        return bits.reshape(y.shape[0], -1)
+
+    def verify_batch(self, X: np.ndarray, p: float = DEFAULT_P) -> np.ndarray:
+        """Пакетный VerifyImage: (n, n_features) -> (n, 2 * n_neurons) bool"""
+        return self.codes_from_outputs(self.neuron_outputs(X, p))
+
+    def hamming_batch(self, X: np.ndarray, p: float = DEFAULT_P) -> np.ndarray:
+        """Расстояние Хэмминга до ключа для пакета образов"""
+        return self.hamming_from_codes(self.verify_batch(X, p))
+
+    def hamming_from_codes(self, codes: np.ndarray) -> np.ndarray:
+        # ключ может быть длиннее кода, если нейронов синтезировано меньше neurons_count (как ComputeHamming)
+        n_bits = min(codes.shape[-1], self.key_bits.shape[0])
+        return (codes[..., :n_bits] != self.key_bits[:n_bits]).sum(axis=-1)
+
+    @classmethod
+    def from_arrays(cls, index: int, arrays: Dict[str, np.ndarray]) -> 'CompiledNCT':
+        return cls(index=index, **{name: arrays[name] for name in NCT_ARRAY_NAMES})
+
+
+NCT_ARRAY_NAMES = ('synapses', 'weights', 'thresholds', 'table_indices', 'sx_stranger', 'key_bits')
+
+
+@dataclass
+class CompiledModel:
+    """Все NCT из meta.json"""
+    feature_count: int
+    neurons_count: int
+    neurons_input_count: int
+    own_classes: int
+    total_classes: int
+    ncts: List[CompiledNCT]
+
+    def header(self) -> Dict[str, int]:
+        return {
+            'feature_count': self.feature_count,
+            'neurons_count': self.neurons_count,
+            'neurons_input_count': self.neurons_input_count,
+            'own_classes': self.own_classes,
+            'total_classes': self.total_classes,
+        }
+
+
+@dataclass
+class CompiledGraph:
+    """Граф корреляций из graph.json в CSR-представлении"""
+    nct_index: int
+    importance: np.ndarray          # (n_features,) float64, 0 для отсутствующих признаков
+    parent_ids: np.ndarray          # (n_parents,) int32, в порядке убывания importance
+    partner_indptr: np.ndarray      # (n_features + 1,) int64
+    partner_indices: np.ndarray     # (n_edges,) int32
+    partner_weights: np.ndarray     # (n_edges,) float64
+    partner_correlation: np.ndarray  # (n_edges,) float64 — корреляция со знаком, NaN если не измерена
+
+    def partners(self, feature_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.partner_indptr[feature_id], self.partner_indptr[feature_id + 1]
+        return self.partner_indices[lo:hi], self.partner_weights[lo:hi]
+
+    def partner_correlations(self, feature_id: int) -> np.ndarray:
+        lo, hi = self.partner_indptr[feature_id], self.partner_indptr[feature_id + 1]
+        return self.partner_correlation[lo:hi]
+
+    @property
+    def has_correlation(self) -> bool:
+        return bool(self.partner_correlation.size) and not np.isnan(self.partner_correlation).all()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in GRAPH_ARRAY_NAMES}
+
+    @classmethod
+    def from_arrays(cls, nct_index: int, arrays: Dict[str, np.ndarray]) -> 'CompiledGraph':
+        return cls(nct_index=nct_index, **{name: arrays[name] for name in GRAPH_ARRAY_NAMES})
+
+
+GRAPH_ARRAY_NAMES = (
+    'importance', 'parent_ids', 'partner_indptr', 'partner_indices', 'partner_weights', 'partner_correlation',
+)
+
+
+def compile_nct(nct_data: Dict, index: int) -> CompiledNCT:
+    key = nct_data['key_bits']
+    return CompiledNCT(
+        index=index,
+        synapses=np.asarray(nct_data['synapses'], dtype=np.int32),
+        weights=np.asarray(nct_data['weights'], dtype=np.float64),
+        thresholds=np.asarray(nct_data['thresholds'], dtype=np.float64),
+        table_indices=np.asarray(nct_data.get('table_indices', nct_data.get('table_indexes')), dtype=np.int32),
+        sx_stranger=np.asarray(nct_data['sx_stranger'], dtype=np.float64),
+        key_bits=np.frombuffer(key.encode('ascii'), dtype=np.uint8) == ord('1'),
+    )
+
+
+def load_compiled_model(meta_path: str) -> CompiledModel:
+    """Загрузить meta.json и скомпилировать все NCT"""
+    meta_path = Path(meta_path)
+    if not meta_path.exists():
+        raise FileNotFoundError(f"File not found: {meta_path}")
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    return CompiledModel(
+        feature_count=int(meta['feature_count']),
+        neurons_count=int(meta['neurons_count']),
+        neurons_input_count=int(meta['neurons_input_count']),
+        own_classes=int(meta['own_classes']),
+        total_classes=int(meta['total_classes']),
+        ncts=[compile_nct(nct, i) for i, nct in enumerate(meta['ncts'])],
+    )
+
+
+def load_compiled_graph(graph_path: str, n_features: int) -> CompiledGraph:
+    """Загрузить graph.json (формат CorrelationGraphBuilder.save_graph_to_json)"""
+    graph_path = Path(graph_path)
+    if not graph_path.exists():
+        raise FileNotFoundError(f"File not found: {graph_path}")
+
+    with open(graph_path, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+
+    importance = np.zeros(n_features, dtype=np.float64)
+    partners_by_feature: Dict[int, Dict[str, float]] = {}
+    correlation_by_feature: Dict[int, Dict[str, float]] = {}
+    for feature_id, feature in graph['features'].items():
+        fid = int(feature_id)
+        importance[fid] = feature.get('importance', 0.0)
+        partners_by_feature[fid] = feature.get('partners', {})
+        correlation_by_feature[fid] = feature.get('partner_correlation', {})
+
+    # порядок партнёров сохраняется таким, как в graph.json (по убыванию importance)
+    indptr = np.zeros(n_features + 1, dtype=np.int64)
+    indices, weights, correlations = [], [], []
+    for fid in range(n_features):
+        partners = partners_by_feature.get(fid, {})
+        signed = correlation_by_feature.get(fid, {})
+        indices.extend(int(pid) for pid in partners)
+        weights.extend(float(w) for w in partners.values())
+        correlations.extend(float(signed.get(pid, np.nan)) for pid in partners)
+        indptr[fid + 1] = len(indices)
+
+    # родительские признаки — как GetParentFeatures в NCT_attack.cs
+    nonzero = importance[importance > 0.0]
+    threshold = nonzero.mean() if nonzero.size else 0.0
+    parent_ids = np.array(
+        [int(fid) for fid in graph['features'] if importance[int(fid)] >= threshold],
+        dtype=np.int32,
+    )
+    parent_ids = parent_ids[np.argsort(-importance[parent_ids], kind='stable')]
+
+    return CompiledGraph(
+        nct_index=int(graph.get('nct_index', 0)),
+        importance=importance,
+        parent_ids=parent_ids,
+        partner_indptr=indptr,
+        partner_indices=np.asarray(indices, dtype=np.int32),
+        partner_weights=np.asarray(weights, dtype=np.float64),
+        partner_correlation=np.asarray(correlations, dtype=np.float64),
+    )
+
+
+def load_feature_matrix(csv_path: str, feature_count: int = 512) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSV в формате id,class,split,f0..fN -> (ids, classes, X)"""
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"File not found: {csv_path}")
+
+    ids, classes, rows = [], [], []
+    with open(csv_path, 'r') as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            if len(row) < 3 + feature_count:
+                continue
+            ids.append(int(row[0]))
+            classes.append(int(row[1]))
+            rows.append(row[3:3 + feature_count])
+
+    X = np.asarray(rows, dtype=np.float64).reshape(len(rows), feature_count)
+    return np.asarray(ids, dtype=np.int64), np.asarray(classes, dtype=np.int64), X
+
+
+def iter_feature_chunks(
+    path: str,
+    chunk_size: int = 10000,
+    feature_count: int = 512,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Поблочное чтение признаков без загрузки файла целиком -> (ids, classes, X)
+
+    Поддерживаются CSV (id,class,split,f0..fN) и .npy (матрица признаков без
+    меток, читается через memmap; ids — номера строк, classes = -1).
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+
+    if path.suffix == '.npy':
+        data = np.load(path, mmap_mode='r')
+        for start in range(0, data.shape[0], chunk_size):
+            X = np.asarray(data[start:start + chunk_size, :feature_count], dtype=np.float64)
+            ids = np.arange(start, start + X.shape[0], dtype=np.int64)
+            yield ids, np.full(X.shape[0], -1, dtype=np.int64), X
+        return
+
+    import pandas as pd
+
+    columns = ['id', 'class'] + [f'f{i}' for i in range(feature_count)]
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+        yield (
+            chunk['id'].to_numpy(dtype=np.int64),
+            chunk['class'].to_numpy(dtype=np.int64),
+            chunk[columns[2:]].to_numpy(dtype=np.float64),
+        )
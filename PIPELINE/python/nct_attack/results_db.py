@@ -0,0 +1,443 @@
+# python/nct_attack/results_db.py
+# Индексированная база результатов (SQLite) вместо разрозненных results.json
+#
+# Запись (только добавление):
+#     db = ResultsDB('runs/results.db')
+#     db.record_run(run_name, attack_name='fgsm', epsilon=0.01, model_path='model/meta.json', metrics={...})
+#
+# Импорт существующих результатов:
+#     python results_db.py import runs/ C#/NCT_attack/results/ --db runs/results.db --model model/meta.json
+#
+# Запросы:
+#     db.runs_frame(attack_name='fgsm')          # pandas.DataFrame, метрики — колонки
+#     db.metric_array('attack_success_rate', attack_name='fgsm')
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        TEXT PRIMARY KEY,
+    run_name      TEXT NOT NULL,
+    source        TEXT NOT NULL,
+    timestamp     TEXT,
+    attack_name   TEXT,
+    epsilon       REAL,
+    model_path    TEXT,
+    model_hash    TEXT,
+    target_nct    INTEGER,
+    data_path     TEXT,
+    config_json   TEXT,
+    imported_from TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    name   TEXT NOT NULL,
+    value  REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id        TEXT NOT NULL REFERENCES runs(run_id),
+    sample_index  INTEGER NOT NULL,
+    sample_id     INTEGER,
+    true_class    INTEGER,
+    hamming_clean INTEGER,
+    hamming_adv   INTEGER,
+    success       INTEGER,
+    iterations    INTEGER,
+    queries       INTEGER,
+    radius        REAL,
+    PRIMARY KEY (run_id, sample_index)
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id  TEXT NOT NULL REFERENCES runs(run_id),
+    phase   TEXT NOT NULL,
+    seconds REAL,
+    PRIMARY KEY (run_id, phase)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_name ON runs(run_name);
+CREATE INDEX IF NOT EXISTS idx_runs_attack ON runs(attack_name);
+CREATE INDEX IF NOT EXISTS idx_runs_epsilon ON runs(epsilon);
+CREATE INDEX IF NOT EXISTS idx_runs_model_hash ON runs(model_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_target_nct ON runs(target_nct);
+CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(name);
+"""
+
+_SAMPLE_COLUMNS = (
+    'sample_index', 'sample_id', 'true_class', 'hamming_clean', 'hamming_adv',
+    'success', 'iterations', 'queries', 'radius',
+)
+
+
+def file_hash(path: str) -> Optional[str]:
+    """sha256 файла модели (первые 16 hex-символов) — ключ для сравнения прогонов"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        return None if np.isinf(value) or np.isnan(value) else value
+    return None
+
+
+def _resolve_run_path(results_json: Path, path: str) -> str:
+    """Относительный путь из конфига прогона — от ближайшего предка results.json, где он существует"""
+    if Path(path).is_absolute():
+        return path
+    for parent in results_json.parents:
+        candidate = parent / path
+        if candidate.exists():
+            return str(candidate)
+    return path
+
+
+def _sample_row(run_id: str, index: int, sample: Dict[str, Any]) -> tuple:
+    row = {col: sample.get(col) for col in _SAMPLE_COLUMNS}
+    if row['sample_index'] is None:
+        row['sample_index'] = index
+    if row['success'] is not None:
+        row['success'] = int(bool(row['success']))
+    row['radius'] = _number(row['radius'])
+    for col in _SAMPLE_COLUMNS:
+        if isinstance(row[col], np.integer):
+            row[col] = int(row[col])
+    return (run_id, *(row[col] for col in _SAMPLE_COLUMNS))
+
+
+class ResultsDB:
+    """Локальное append-only хранилище прогонов"""
+
+    def __init__(self, db_path: str = "runs/results.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self._hash_cache: Dict[str, Optional[str]] = {}
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'ResultsDB':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # ========== Запись ==========
+
+    def has_run(self, run_id: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row is not None
+
+    def _model_hash(self, model_path: Optional[str]) -> Optional[str]:
+        if not model_path:
+            return None
+        if model_path not in self._hash_cache:
+            self._hash_cache[model_path] = file_hash(model_path)
+        return self._hash_cache[model_path]
+
+    def record_run(
+        self,
+        run_name: str,
+        source: str = "python",
+        attack_name: Optional[str] = None,
+        epsilon: Optional[float] = None,
+        model_path: Optional[str] = None,
+        target_nct: Optional[int] = None,
+        data_path: Optional[str] = None,
+        config: Optional[Dict] = None,
+        metrics: Optional[Dict[str, Any]] = None,
+        samples: Optional[Iterable[Dict[str, Any]]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        timestamp: Optional[str] = None,
+        imported_from: Optional[str] = None,
+        model_hash: Optional[str] = None,
+    ) -> str:
+        """Добавить прогон и вернуть его ключ run_id = "<run_name>@<timestamp>".
+
+        Повторные запуски с тем же run_name получают новые записи; повторная
+        запись того же ключа — ошибка (база только дополняется). model_hash, если
+        не задан, считается по model_path.
+        """
+        timestamp = timestamp or datetime.now().isoformat()
+        run_id = f"{run_name}@{timestamp}"
+        if self.has_run(run_id):
+            raise ValueError(f"Run already recorded: {run_id}")
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id, run_name, source, timestamp,
+                    attack_name, _number(epsilon), model_path, model_hash or self._model_hash(model_path),
+                    target_nct, data_path, json.dumps(config or {}), imported_from,
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO metrics VALUES (?, ?, ?)",
+                [(run_id, name, _number(value)) for name, value in (metrics or {}).items()
+                 if _number(value) is not None],
+            )
+            self.conn.executemany(
+                "INSERT INTO timings VALUES (?, ?, ?)",
+                [(run_id, phase, float(seconds)) for phase, seconds in (timings or {}).items()],
+            )
+            self.conn.executemany(
+                f"INSERT INTO samples VALUES (?, {', '.join('?' * len(_SAMPLE_COLUMNS))})",
+                (_sample_row(run_id, i, sample) for i, sample in enumerate(samples or [])),
+            )
+        return run_id
+
+    # ========== Импорт существующих результатов ==========
+
+    def import_python_run(self, results_json: str, model_path: Optional[str] = None) -> Optional[str]:
+        """runs/<run_id>/results.json или robustness.json из run_experiment.py
+
+        Хэш модели: по model_path (--model), иначе записанный в results.json при прогоне,
+        иначе по meta.json из конфига прогона (путь — относительно корня проекта прогона).
+        """
+        results_json = Path(results_json).resolve()
+        with open(results_json, 'r') as f:
+            results = json.load(f)
+
+        # ключ совпадает с записью ExperimentRunner.record_results — повторного импорта не будет
+        run_name = results['run_id']
+        if self.has_run(f"{run_name}@{results.get('timestamp')}"):
+            return None
+
+        config = results.get('config', {})
+        attack = config.get('attack', {})
+        model_hash = None
+        if not model_path:
+            model_hash = results.get('model_hash')
+            model_path = config.get('model_meta') or config.get('model')
+            # режим attack до записи model_meta: в config.model лежит model.bin, хэш считается по meta.json
+            if model_path and Path(model_path).suffix == '.bin':
+                model_path = str(Path(model_path).with_name('meta.json'))
+            if model_path and not model_hash:
+                model_hash = self._model_hash(_resolve_run_path(results_json, model_path))
+        robustness = config.get('robustness')
+        # атакуемый NCT: режим robustness или streaming (как в ExperimentRunner.record_results)
+        target_nct = (robustness or config.get('streaming') or {}).get('target_nct')
+        metrics = dict(results.get('metrics', results.get('summary', {})))
+        metrics.update({f"attack_{k}": v for k, v in results.get('attack_stats', {}).items()})
+        if robustness:
+            attack_name = 'robustness'
+        elif 'streaming' in config:
+            attack_name = f"{attack.get('name')}_streaming"
+        else:
+            attack_name = attack.get('name')
+
+        return self.record_run(
+            run_name,
+            source="python",
+            attack_name=attack_name,
+            # identity без шума: epsilon не записывается, как и при живом прогоне
+            epsilon=attack.get('epsilon') if attack.get('name') != 'identity' else None,
+            model_path=model_path,
+            model_hash=model_hash,
+            target_nct=target_nct,
+            data_path=config.get('data'),
+            config=config,
+            metrics=metrics,
+            samples=[
+                {'sample_id': s.get('id'), 'true_class': s.get('class'), 'radius': s.get('radius'),
+                 'hamming_clean': s.get('hamming_clean'), 'hamming_adv': s.get('hamming_at_radius'),
+                 'success': s.get('radius') is not None}
+                for s in results.get('samples', [])
+            ],
+            timings=results.get('timings'),
+            timestamp=results.get('timestamp'),
+            imported_from=str(results_json),
+        )
+
+    def import_csharp_run(self, results_dir: str, model_path: Optional[str] = None) -> Optional[str]:
+        """metrics.json из C#/NCT_attack (results/ или --output)"""
+        metrics_json = (Path(results_dir) / 'metrics.json').resolve()
+        with open(metrics_json, 'r') as f:
+            results = json.load(f)
+
+        timestamp = results.get('timestamp') or datetime.fromtimestamp(metrics_json.stat().st_mtime).isoformat()
+        if self.has_run(f"csharp_graph@{timestamp}"):
+            return None
+
+        per_sample = results.get('metrics', [])
+        params = results.get('attack_parameters', {})
+        threshold = params.get('hamming_threshold', 15)
+
+        def distance(value):
+            # -1 — образец не посещён (бюджет запросов кончился)
+            return None if value is None or value < 0 else value
+
+        samples = []
+        for i, m in enumerate(per_sample):
+            hamming_adv = distance(m.get('final_hamming_distance'))
+            samples.append({
+                'sample_index': m.get('sample_index', i),
+                'hamming_clean': distance(m.get('initial_hamming_distance')),
+                'hamming_adv': hamming_adv,
+                # старые metrics.json без поля success — то же правило порога, что и в C#
+                'success': m.get('success', hamming_adv is not None and hamming_adv < threshold),
+                'iterations': m.get('iterations_completed'),
+                'queries': m.get('queries_spent'),
+            })
+        n = len(samples)
+        visited = [s for s in samples if s['hamming_adv'] is not None]
+        metrics = {
+            'total_samples': n,
+            'attack_success_rate': results.get(
+                'success_rate', sum(s['success'] for s in samples) / n if n else 0.0),
+            'avg_hamming_clean': np.mean([s['hamming_clean'] for s in visited]) if visited else None,
+            'avg_hamming_adv': np.mean([s['hamming_adv'] for s in visited]) if visited else None,
+            'total_queries': results.get('total_queries'),
+        }
+
+        return self.record_run(
+            "csharp_graph",
+            source="csharp",
+            attack_name='graph',
+            model_path=model_path,
+            target_nct=results.get('target_nct'),
+            config=params,
+            metrics=metrics,
+            samples=samples,
+            timestamp=timestamp,
+            imported_from=str(metrics_json),
+        )
+
+    def import_path(self, path: str, model_path: Optional[str] = None) -> List[str]:
+        """Рекурсивно импортировать все results.json / robustness.json / metrics.json"""
+        path = Path(path)
+        files = [path] if path.is_file() else sorted(
+            p for pattern in ('results.json', 'robustness.json', 'metrics.json') for p in path.rglob(pattern)
+        )
+        imported = []
+        for file in files:
+            try:
+                if file.name == 'metrics.json':
+                    run_id = self.import_csharp_run(str(file.parent), model_path)
+                else:
+                    run_id = self.import_python_run(str(file), model_path)
+            except (json.JSONDecodeError, KeyError, ValueError) as e:
+                print(f"[!] Skip {file}: {e}")
+                continue
+            if run_id:
+                imported.append(run_id)
+        return imported
+
+    # ========== Запросы ==========
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column in ('run_name', 'attack_name', 'epsilon', 'model_hash', 'target_nct', 'source'):
+            value = filters.get(column)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                clauses.append(f"r.{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"r.{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def runs_frame(self, **filters):
+        """Прогоны с метриками в колонках (pandas.DataFrame).
+
+        Фильтры: run_name, attack_name, epsilon, model_hash, target_nct, source
+        (значение или список значений).
+        """
+        import pandas as pd
+
+        where, params = self._where(filters)
+        runs = pd.read_sql_query(
+            "SELECT r.run_id, r.run_name, r.source, r.timestamp, r.attack_name, r.epsilon, r.model_hash, "
+            f"r.target_nct, r.data_path FROM runs r{where} ORDER BY r.timestamp",
+            self.conn, params=params,
+        )
+        metrics = pd.read_sql_query(
+            f"SELECT m.run_id, m.name, m.value FROM metrics m JOIN runs r ON r.run_id = m.run_id{where}",
+            self.conn, params=params,
+        )
+        if metrics.empty:
+            return runs.set_index('run_id')
+        wide = metrics.pivot(index='run_id', columns='name', values='value')
+        return runs.set_index('run_id').join(wide)
+
+    def samples_frame(self, run_ids: Optional[List[str]] = None, **filters):
+        """Исходы по образцам (pandas.DataFrame) для выбранных прогонов"""
+        import pandas as pd
+
+        where, params = self._where(filters)
+        if run_ids:
+            where += (" AND " if where else " WHERE ") + f"s.run_id IN ({', '.join('?' * len(run_ids))})"
+            params = params + list(run_ids)
+        return pd.read_sql_query(
+            "SELECT s.*, r.attack_name, r.epsilon, r.model_hash, r.target_nct "
+            f"FROM samples s JOIN runs r ON r.run_id = s.run_id{where} ORDER BY s.run_id, s.sample_index",
+            self.conn, params=params,
+        )
+
+    def metric_array(self, name: str, **filters) -> np.ndarray:
+        """Значения одной метрики по прогонам (NumPy), в порядке времени"""
+        where, params = self._where(filters)
+        where += (" AND " if where else " WHERE ") + "m.name = ?"
+        rows = self.conn.execute(
+            f"SELECT m.value FROM metrics m JOIN runs r ON r.run_id = m.run_id{where} ORDER BY r.timestamp",
+            params + [name],
+        ).fetchall()
+        return np.array([row[0] for row in rows], dtype=np.float64)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="База результатов прогонов (SQLite)")
+    parser.add_argument("--db", type=str, default="runs/results.db", help="Путь к базе")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Импортировать results.json / metrics.json")
+    import_parser.add_argument("paths", nargs="+", help="Файлы или директории (поиск рекурсивный)")
+    import_parser.add_argument("--model", type=str, default=None, help="meta.json: хэш модели для всех импортируемых прогонов")
+
+    query_parser = subparsers.add_parser("query", help="Сводная таблица прогонов")
+    query_parser.add_argument("--attack", type=str, default=None)
+    query_parser.add_argument("--epsilon", type=float, default=None)
+    query_parser.add_argument("--model-hash", type=str, default=None)
+    query_parser.add_argument("--target-nct", type=int, default=None)
+
+    args = parser.parse_args()
+
+    with ResultsDB(args.db) as db:
+        if args.command == "import":
+            total = 0
+            for path in args.paths:
+                imported = db.import_path(path, model_path=args.model)
+                total += len(imported)
+                print(f"  - {path}: {len(imported)} прогонов")
+            print(f"[DONE] Импортировано: {total} -> {args.db}")
+        else:
+            frame = db.runs_frame(
+                attack_name=args.attack,
+                epsilon=args.epsilon,
+                model_hash=args.model_hash,
+                target_nct=args.target_nct,
+            )
+            print(frame.to_string())
@@ -0,0 +1,205 @@
+# python/nct_attack/robustness.py
+# Кривые устойчивости: минимальный радиус возмущения для каждого образца
+#
+# Вместо прогона attack_fgsm на сетке epsilon для каждого образца фиксируется
+# направление шума d, и бисекцией по epsilon ищется минимальный радиус, при котором
+# x + epsilon * clip(d, -3, 3) меняет решение NCT (или сдвигает Хэмминг на заданную
+# величину). Все образцы обрабатываются одним пакетом: каждая итерация бисекции —
+# один вызов verify_batch по ещё не сошедшимся образцам.
+#
+# Успех не монотонен по epsilon (Хэмминг может вернуться к исходному при большем шуме),
+# поэтому перед бисекцией идёт грубый просмотр сетки eps_max * 2^-k, k = 0..bracket_levels
+# (по пакету на уровень): бисекция ведётся между наименьшим успешным уровнем и
+# предыдущим (неуспешным). Внутри этой скобки монотонность по-прежнему предполагается.
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from nct_model import CompiledNCT
+
+# Порог Хэмминга для решения "Свой" (как в EvaluateNctQuality)
+DEFAULT_HAMMING_THRESHOLD = 15
+
+# Ограничение шума, как в attack_fgsm: |delta| <= 3 * epsilon
+NOISE_CLIP = 3.0
+
+
+@dataclass
+class RobustnessResult:
+    """Радиусы и исходные расстояния по образцам"""
+    radii: np.ndarray           # (n,) минимальный epsilon, inf — не найден до eps_max
+    hamming_clean: np.ndarray   # (n,)
+    hamming_at_radius: np.ndarray  # (n,) Хэмминг на найденном радиусе (-1 для inf)
+    eps_max: float
+    precision: float
+    n_evaluations: int          # число пакетных вызовов модели
+
+    def curve(self, n_points: int = 101) -> Dict[str, list]:
+        """Доля успешных атак как функция epsilon"""
+        eps_grid = np.linspace(0.0, self.eps_max, n_points)
+        success = (self.radii[None, :] <= eps_grid[:, None]).mean(axis=1)
+        return {'epsilon': eps_grid.tolist(), 'success_rate': success.tolist()}
+
+    def summary(self) -> Dict[str, float]:
+        finite = np.isfinite(self.radii)
+        curve = self.curve()
+        eps_grid = np.asarray(curve['epsilon'])
+        success = np.asarray(curve['success_rate'])
+        # площадь под кривой, нормированная на eps_max (1.0 — все образцы ломаются при eps -> 0)
+        auc = float(np.sum((success[1:] + success[:-1]) * np.diff(eps_grid)) / 2 / self.eps_max)
+        return {
+            'total_samples': int(self.radii.size),
+            'success_rate_at_eps_max': float(finite.mean()) if self.radii.size else 0.0,
+            'median_radius': float(np.median(self.radii)) if self.radii.size else math.inf,
+            'mean_finite_radius': float(self.radii[finite].mean()) if finite.any() else math.inf,
+            'auc': auc,
+            'eps_max': self.eps_max,
+            'precision': self.precision,
+            'n_evaluations': self.n_evaluations,
+        }
+
+
+def _is_success(
+    hamming: np.ndarray,
+    hamming_clean: np.ndarray,
+    hamming_threshold: int,
+    min_hamming_shift: Optional[int],
+) -> np.ndarray:
+    if min_hamming_shift is not None:
+        return np.abs(hamming - hamming_clean) >= min_hamming_shift
+    # смена решения "Свой" / "Чужой"
+    return (hamming < hamming_threshold) != (hamming_clean < hamming_threshold)
+
+
+def _bisect_chunk(
+    nct: CompiledNCT,
+    X: np.ndarray,
+    rng: np.random.Generator,
+    eps_max: float,
+    precision: float,
+    hamming_threshold: int,
+    min_hamming_shift: Optional[int],
+    n_directions: int,
+    bracket_levels: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    n_samples = X.shape[0]
+
+    # каждое направление — отдельная строка пакета
+    Xr = np.repeat(X, n_directions, axis=0)
+    directions = np.clip(rng.standard_normal(Xr.shape), -NOISE_CLIP, NOISE_CLIP)
+
+    hamming_clean = nct.hamming_batch(X)
+    hamming_clean_r = np.repeat(hamming_clean, n_directions)
+
+    def evaluate(rows: np.ndarray, eps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        hamming = nct.hamming_batch(Xr[rows] + eps[:, None] * directions[rows])
+        success = _is_success(hamming, hamming_clean_r[rows], hamming_threshold, min_hamming_shift)
+        return success, hamming
+
+    n_rows = Xr.shape[0]
+    lo = np.zeros(n_rows)
+    hi = np.full(n_rows, eps_max)
+    hamming_hi = np.full(n_rows, -1, dtype=np.int64)
+
+    # 1. Скобки: просмотр уровней от eps_max вниз; для каждой строки запоминается
+    #    наименьший успешный уровень, нижняя граница — следующий уровень (или 0).
+    #    Строки без успеха ни на одном уровне из бисекции исключаются
+    all_rows = np.arange(n_rows)
+    levels = eps_max * 2.0 ** -np.arange(bracket_levels + 1)
+    n_evaluations = 1
+    for k, eps in enumerate(levels):
+        success, hamming = evaluate(all_rows, np.full(n_rows, eps))
+        hi[success] = eps
+        hamming_hi[success] = hamming[success]
+        lo[success] = levels[k + 1] if k + 1 < levels.size else 0.0
+        n_evaluations += 1
+    active = all_rows[hamming_hi >= 0]
+
+    # 2. Бисекция внутри скобки: инвариант — на lo успеха нет, на hi есть
+    n_steps = max(0, math.ceil(math.log2(eps_max / precision)))
+    for _ in range(n_steps):
+        if active.size == 0:
+            break
+        mid = (lo[active] + hi[active]) / 2
+        success, hamming = evaluate(active, mid)
+        hi[active[success]] = mid[success]
+        hamming_hi[active[success]] = hamming[success]
+        lo[active[~success]] = mid[~success]
+        n_evaluations += 1
+        active = active[(hi[active] - lo[active]) > precision]
+
+    radii_r = np.where(hamming_hi >= 0, hi, np.inf)
+
+    # минимум по направлениям
+    radii_r = radii_r.reshape(n_samples, n_directions)
+    best = radii_r.argmin(axis=1)
+    rows = np.arange(n_samples)
+    hamming_at_radius = hamming_hi.reshape(n_samples, n_directions)[rows, best]
+    return radii_r[rows, best], hamming_clean, hamming_at_radius, n_evaluations
+
+
+def minimal_perturbation_radii(
+    nct: CompiledNCT,
+    X: np.ndarray,
+    eps_max: float = 1.0,
+    precision: float = 1e-3,
+    hamming_threshold: int = DEFAULT_HAMMING_THRESHOLD,
+    min_hamming_shift: Optional[int] = None,
+    n_directions: int = 1,
+    seed: int = 42,
+    chunk_size: int = 4096,
+    bracket_levels: int = 8,
+) -> RobustnessResult:
+    """Пакетная бисекция минимального радиуса для всех образцов сразу.
+
+    Успех по epsilon не монотонен, поэтому сначала ищется скобка на сетке
+    eps_max * 2^-k (k = 0..bracket_levels): наименьший успешный уровень и предыдущий
+    неуспешный. Бисекция предполагает монотонность только внутри скобки; успех,
+    который есть лишь между уровнями сетки, будет пропущен.
+
+    Args:
+        nct: атакуемый NCT
+        X: образцы (n, n_features)
+        eps_max: верхняя граница поиска
+        precision: точность радиуса (итераций бисекции ~ log2(eps_max / precision))
+        hamming_threshold: порог решения "Свой" (hamming < threshold)
+        min_hamming_shift: если задан, успех — сдвиг Хэмминга не меньше этой величины
+            вместо смены решения
+        n_directions: число случайных направлений на образец (берётся минимум радиуса)
+        seed: зерно генератора направлений
+        chunk_size: образцов в одном пакете (ограничивает память)
+        bracket_levels: уровней грубой сетки eps_max * 2^-k (0 — только eps_max)
+
+    Returns:
+        RobustnessResult
+    """
+    X = np.asarray(X, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+
+    parts = []
+    n_evaluations = 0
+    for start in range(0, X.shape[0], chunk_size):
+        *arrays, n_eval = _bisect_chunk(
+            nct, X[start:start + chunk_size], rng, eps_max, precision,
+            hamming_threshold, min_hamming_shift, n_directions, bracket_levels,
+        )
+        parts.append(arrays)
+        n_evaluations += n_eval
+
+    if parts:
+        radii, hamming_clean, hamming_at_radius = (np.concatenate(a) for a in zip(*parts))
+    else:
+        radii = np.empty(0)
+        hamming_clean = hamming_at_radius = np.empty(0, dtype=np.int64)
+
+    return RobustnessResult(
+        radii=radii,
+        hamming_clean=hamming_clean,
+        hamming_at_radius=hamming_at_radius,
+        eps_max=eps_max,
+        precision=precision,
+        n_evaluations=n_evaluations,
+    )
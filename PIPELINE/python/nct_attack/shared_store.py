@@ -0,0 +1,263 @@
+# python/nct_attack/shared_store.py
+# Однократная загрузка модели, графа и данных в shared memory для пула процессов
+#
+# Родительский процесс:
+#     with SharedModelStore('model/meta.json', 'model/graph.json', 'data/data_for_attack.csv') as store:
+#         with multiprocessing.Pool(32, initializer=init_worker, initargs=(store.handle,)) as pool:
+#             pool.map(task, range(n))
+#
+# Рабочий процесс:
+#     view = worker_view()       # zero-copy, только чтение
+#     view.model.ncts[0].hamming_batch(view.X)
+
+import sys
+import weakref
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from nct_model import (
+    CompiledGraph,
+    CompiledModel,
+    CompiledNCT,
+    load_compiled_graph,
+    load_compiled_model,
+    load_feature_matrix,
+)
+
+
+# Выравнивание массивов внутри блока
+_ALIGN = 64
+
+
+@dataclass
+class SharedArraySpec:
+    """Положение одного массива в блоке shared memory"""
+    offset: int
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+@dataclass
+class SharedModelHandle:
+    """Picklable-дескриптор, передаваемый в рабочие процессы"""
+    shm_name: str
+    header: Dict[str, int]
+    nct_count: int
+    graph_nct_index: Optional[int] = None
+    arrays: Dict[str, SharedArraySpec] = field(default_factory=dict)
+
+    def has(self, name: str) -> bool:
+        return name in self.arrays
+
+
+def _release(segments: List[shared_memory.SharedMemory]) -> None:
+    # Вызывается один раз: явно через close(), сборщиком мусора или при выходе интерпретатора
+    for shm in segments:
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    segments.clear()
+
+
+def _view(shm: shared_memory.SharedMemory, spec: SharedArraySpec) -> np.ndarray:
+    return np.ndarray(spec.shape, dtype=np.dtype(spec.dtype), buffer=shm.buf, offset=spec.offset)
+
+
+class SharedModelStore:
+    """Владелец блока shared memory с моделью, графом и матрицей признаков.
+
+    Все массивы раскладываются в один блок с выравниванием; рабочие процессы
+    получают numpy-представления поверх него без копирования.
+    Блок удаляется при close(), выходе из контекста, сборке объекта или
+    завершении интерпретатора. При аварийном завершении (SIGKILL) на POSIX
+    оставшийся блок освобождает resource_tracker модуля multiprocessing.
+    """
+
+    def __init__(
+        self,
+        meta_path: str,
+        graph_path: Optional[str] = None,
+        data_csv: Optional[str] = None,
+    ):
+        self.meta_path = meta_path
+        self.graph_path = graph_path
+        self.data_csv = data_csv
+        self.handle: Optional[SharedModelHandle] = None
+
+        self._segments: List[shared_memory.SharedMemory] = []
+        self._finalizer = weakref.finalize(self, _release, self._segments)
+
+    def __enter__(self) -> 'SharedModelStore':
+        self.publish()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def publish(self) -> SharedModelHandle:
+        """Загрузить артефакты и скопировать их в shared memory"""
+        if self.handle is not None:
+            return self.handle
+        if self.closed:
+            raise RuntimeError("SharedModelStore is closed")
+
+        model = load_compiled_model(self.meta_path)
+        arrays: Dict[str, np.ndarray] = {}
+        for nct in model.ncts:
+            for name, arr in nct.arrays().items():
+                arrays[f"nct/{nct.index}/{name}"] = arr
+
+        graph_nct_index = None
+        if self.graph_path:
+            graph = load_compiled_graph(self.graph_path, model.feature_count)
+            graph_nct_index = graph.nct_index
+            for name, arr in graph.arrays().items():
+                arrays[f"graph/{name}"] = arr
+
+        if self.data_csv:
+            ids, classes, X = load_feature_matrix(self.data_csv, model.feature_count)
+            arrays["data/ids"] = ids
+            arrays["data/classes"] = classes
+            arrays["data/X"] = X
+
+        # раскладка всех массивов в одном блоке
+        specs: Dict[str, SharedArraySpec] = {}
+        size = 0
+        for name, arr in arrays.items():
+            size = -(-size // _ALIGN) * _ALIGN
+            specs[name] = SharedArraySpec(offset=size, shape=arr.shape, dtype=arr.dtype.str)
+            size += arr.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self._segments.append(shm)
+        try:
+            for name, arr in arrays.items():
+                dst = _view(shm, specs[name])
+                dst[...] = arr
+                del dst
+        except BaseException:
+            self.close()
+            raise
+
+        print(f"[DONE] Shared memory {shm.name}: {len(specs)} массивов, {shm.size / 2 ** 20:.1f} MB")
+
+        self.handle = SharedModelHandle(
+            shm_name=shm.name,
+            header=model.header(),
+            nct_count=len(model.ncts),
+            graph_nct_index=graph_nct_index,
+            arrays=specs,
+        )
+        return self.handle
+
+    def close(self) -> None:
+        """Освободить блок (идемпотентно)"""
+        self._finalizer()
+        self.handle = None
+
+
+class SharedModelView:
+    """Read-only представление артефактов внутри рабочего процесса"""
+
+    def __init__(self, handle: SharedModelHandle):
+        self.handle = handle
+        if sys.version_info >= (3, 13):
+            # владелец блока — родитель, рабочий процесс не должен его удалять
+            self._shm = shared_memory.SharedMemory(name=handle.shm_name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name=handle.shm_name)
+
+        self._arrays: Dict[str, np.ndarray] = {}
+        for name, spec in handle.arrays.items():
+            arr = _view(self._shm, spec)
+            arr.flags.writeable = False
+            self._arrays[name] = arr
+
+        header = handle.header
+        self.model = CompiledModel(
+            ncts=[
+                CompiledNCT.from_arrays(i, self._prefixed(f"nct/{i}/"))
+                for i in range(handle.nct_count)
+            ],
+            **header,
+        )
+        self.graph: Optional[CompiledGraph] = None
+        if handle.graph_nct_index is not None:
+            self.graph = CompiledGraph.from_arrays(handle.graph_nct_index, self._prefixed("graph/"))
+
+        self.ids = self._arrays.get("data/ids")
+        self.classes = self._arrays.get("data/classes")
+        self.X = self._arrays.get("data/X")
+
+    def _prefixed(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            name[len(prefix):]: arr
+            for name, arr in self._arrays.items()
+            if name.startswith(prefix)
+        }
+
+    def close(self) -> None:
+        # Сначала отпускаем все ссылки на буферы, иначе shm.close() бросит BufferError
+        self.model = None
+        self.graph = None
+        self.ids = self.classes = self.X = None
+        self._arrays.clear()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+
+def attach(handle: SharedModelHandle) -> SharedModelView:
+    return SharedModelView(handle)
+
+
+# ========== Инициализация пула процессов ==========
+
+_WORKER_VIEW: Optional[SharedModelView] = None
+
+
+def init_worker(handle: SharedModelHandle) -> None:
+    """initializer для multiprocessing.Pool / ProcessPoolExecutor"""
+    global _WORKER_VIEW
+    _WORKER_VIEW = attach(handle)
+
+
+def worker_view() -> SharedModelView:
+    if _WORKER_VIEW is None:
+        raise RuntimeError("Worker is not initialized: pass init_worker as Pool initializer")
+    return _WORKER_VIEW
+
+
+def _hamming_task(nct_index: int) -> Tuple[int, float]:
+    view = worker_view()
+    return nct_index, float(view.model.ncts[nct_index].hamming_batch(view.X).mean())
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="Проверка shared memory: средний Хэмминг по всем NCT")
+    parser.add_argument("--meta-path", type=str, default="../model/meta.json", help="Путь к meta.json")
+    parser.add_argument("--graph-path", type=str, default=None, help="Путь к graph.json")
+    parser.add_argument("--data-csv", type=str, default="../data/data_for_attack.csv", help="CSV с признаками")
+    parser.add_argument("--workers", type=int, default=4, help="Количество процессов")
+
+    args = parser.parse_args()
+
+    with SharedModelStore(args.meta_path, args.graph_path, args.data_csv) as store:
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(store.handle,)) as pool:
+            for nct_index, hamming in pool.imap(_hamming_task, range(store.handle.nct_count)):
+                print(f"  [NCT {nct_index}] средний Хэмминг: {hamming:.2f}")
@@ -0,0 +1,237 @@
+# python/nct_attack/stages/stage_02_augment.py
+# Этап 2: аугментация образов вдоль коррелированных признаков графа
+#
+# Для каждого исходного образа генерируется variants_per_sample вариантов. В каждом
+# варианте выбираются parents_per_variant родительских признаков графа (вероятность
+# пропорциональна importance); родитель сдвигается на z * sd, а все его партнёры —
+# согласованно на z * sign(corr) * weight * sd, где sd — СКО признака в классе образа,
+# weight — вес ребра графа (не меньше min_coupling), corr — измеренная корреляция
+# родителя и партнёра (partner_correlation в graph.json или correlation.npz). Без
+# корреляций знак неизвестен, и партнёры сдвигаются в ту же сторону, что и родитель.
+# Сверху добавляется малый независимый шум.
+#
+# Варианты пишутся порциями в бинарное хранилище .npy (memmap), а в
+# model/augmentation_data.json — только манифест с путями и параметрами.
+# Случайные числа берутся порциями, поэтому при том же seed результат зависит и от chunk_size.
+
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from logger import get_logger
+from correlation import load_correlation
+from nct_model import CompiledGraph, load_compiled_graph, load_feature_matrix
+
+logger = get_logger(__name__)
+
+
+def _class_sd(X: np.ndarray, classes: np.ndarray) -> Dict[int, np.ndarray]:
+    # СКО признаков по классам; для классов из одного образа — общее СКО
+    global_sd = X.std(axis=0)
+    sd = {}
+    for class_id in np.unique(classes):
+        rows = X[classes == class_id]
+        sd[int(class_id)] = rows.std(axis=0) if rows.shape[0] > 1 else global_sd
+    return sd
+
+
+def _loading_matrix(graph: CompiledGraph, n_features: int, min_coupling: float,
+                    correlation: Optional[np.ndarray] = None) -> np.ndarray:
+    # строка p: единичный сдвиг родителя и связанные сдвиги его партнёров (знак — по корреляции)
+    L = np.zeros((graph.parent_ids.size, n_features), dtype=np.float64)
+    for row, parent in enumerate(graph.parent_ids):
+        partners, weights = graph.partners(int(parent))
+        if correlation is not None:
+            corr = correlation[parent, partners]
+        else:
+            corr = graph.partner_correlations(int(parent))
+        sign = np.where(np.nan_to_num(corr, nan=1.0) < 0.0, -1.0, 1.0)
+        L[row, partners] = sign * np.maximum(weights, min_coupling)
+        L[row, parent] = 1.0
+    return L
+
+
+def stage_02_augment(
+    graph_json_path: str = "model/graph.json",
+    data_csv: str = "data/data_for_attack.csv",
+    output_path: str = "model/augmentation_data.json",
+    store_dir: Optional[str] = None,
+    correlation_path: Optional[str] = None,
+    correlation_class: Optional[int] = None,
+    feature_count: int = 512,
+    variants_per_sample: int = 100,
+    parents_per_variant: int = 3,
+    sigma_scale: float = 0.5,
+    min_coupling: float = 0.25,
+    noise_scale: float = 0.05,
+    chunk_size: int = 10000,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """
+    Сгенерировать аугментированный набор и записать его в бинарное хранилище
+
+    Args:
+        graph_json_path: путь к graph.json (этап 1)
+        data_csv: исходные образы (id,class,split,f0..)
+        output_path: манифест аугментации (JSON)
+        store_dir: директория .npy-файлов (по умолчанию рядом с манифестом)
+        correlation_path: correlation.npz — знаки связей, если в графе нет partner_correlation
+        correlation_class: класс матрицы в correlation.npz (None — глобальная)
+        feature_count: число признаков
+        variants_per_sample: вариантов на исходный образ
+        parents_per_variant: родительских признаков, сдвигаемых в одном варианте
+        sigma_scale: амплитуда сдвига в долях СКО признака в классе
+        min_coupling: минимальный вес связи родитель -> партнёр
+        noise_scale: независимый шум в долях СКО признака
+        chunk_size: вариантов в одной порции записи (при том же seed влияет на результат)
+        seed: зерно генератора
+
+    Returns:
+        dict с путём к манифесту и размерами набора
+    """
+    logger.info("=" * 70)
+    logger.info("ЭТАП 2: Аугментация вдоль графа корреляций")
+    logger.info("=" * 70)
+
+    ids, classes, X = load_feature_matrix(data_csv, feature_count)
+    graph = load_compiled_graph(graph_json_path, feature_count)
+    if graph.parent_ids.size == 0:
+        raise ValueError(f"В графе {graph_json_path} нет родительских признаков")
+
+    class_sd = _class_sd(X, classes)
+    sd_rows = np.stack([class_sd[int(c)] for c in classes])
+    correlation = None
+    if graph.has_correlation:
+        coupling = "signed (graph partner_correlation)"
+    elif correlation_path:
+        correlation = np.nan_to_num(load_correlation(correlation_path, correlation_class))
+        coupling = f"signed ({correlation_path})"
+    else:
+        coupling = "unsigned"
+        logger.warning("  - В графе нет корреляций со знаком и не задан correlation_path: "
+                       "партнёры сдвигаются в ту же сторону, что и родитель")
+    L = _loading_matrix(graph, feature_count, min_coupling, correlation)
+
+    parent_p = graph.importance[graph.parent_ids]
+    parent_p = parent_p / parent_p.sum()
+    k = min(parents_per_variant, graph.parent_ids.size)
+
+    n_base = X.shape[0]
+    n_rows = n_base * variants_per_sample
+
+    output_path = Path(output_path)
+    store_dir = Path(store_dir) if store_dir else output_path.with_suffix('')
+    store_dir.mkdir(parents=True, exist_ok=True)
+    features_path = store_dir / "features.npy"
+    source_path = store_dir / "source_index.npy"
+
+    features = np.lib.format.open_memmap(features_path, mode='w+', dtype=np.float32, shape=(n_rows, feature_count))
+    source = np.lib.format.open_memmap(source_path, mode='w+', dtype=np.int64, shape=(n_rows,))
+
+    logger.info(f"  - Исходных образов: {n_base}, вариантов на образ: {variants_per_sample}")
+    logger.info(f"  - Родительских признаков: {graph.parent_ids.size}, сдвигаемых в варианте: {k}")
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        m = stop - start
+        src = np.arange(start, stop) // variants_per_sample
+
+        # выбор родителей без повторов в строке: top-k случайных ключей Gumbel
+        keys = np.log(parent_p) - np.log(-np.log(rng.random((m, parent_p.size))))
+        chosen = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+        Z = np.zeros((m, parent_p.size))
+        np.put_along_axis(Z, chosen, rng.standard_normal((m, k)), axis=1)
+
+        sd = sd_rows[src]
+        delta = (Z @ L) * sd * sigma_scale + rng.standard_normal((m, feature_count)) * sd * noise_scale
+        features[start:stop] = X[src] + delta
+        source[start:stop] = src
+
+        logger.info(f"  Записано {stop}/{n_rows}")
+
+    features.flush()
+    source.flush()
+    del features, source
+
+    manifest = {
+        "format": "npy",
+        "features": str(features_path),
+        "source_index": str(source_path),
+        "base_ids": ids.tolist(),
+        "base_classes": classes.tolist(),
+        "n_rows": n_rows,
+        "feature_count": feature_count,
+        "dtype": "float32",
+        "params": {
+            "graph": str(graph_json_path),
+            "data": str(data_csv),
+            "variants_per_sample": variants_per_sample,
+            "parents_per_variant": k,
+            "sigma_scale": sigma_scale,
+            "min_coupling": min_coupling,
+            "noise_scale": noise_scale,
+            "coupling": coupling,
+            "seed": seed,
+            # случайные числа берутся порциями: воспроизводимость — по паре (seed, chunk_size)
+            "chunk_size": chunk_size,
+        },
+    }
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    size_mb = features_path.stat().st_size / 2 ** 20
+    logger.info(f"✓ Аугментация сохранена: {features_path} ({size_mb:.1f} MB), манифест {output_path}")
+
+    return {
+        "augmentation_path": str(output_path),
+        "features_path": str(features_path),
+        "n_rows": n_rows,
+        "feature_count": feature_count,
+    }
+
+
+def load_augmentation(manifest_path: str = "model/augmentation_data.json"):
+    """Открыть аугментированный набор без загрузки в память -> (features memmap, source_index, manifest)"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    features = np.load(manifest["features"], mmap_mode='r')
+    source = np.load(manifest["source_index"], mmap_mode='r')
+    return features, source, manifest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Этап 2: аугментация вдоль графа корреляций")
+    parser.add_argument("--graph-path", type=str, default="model/graph.json", help="Путь к graph.json")
+    parser.add_argument("--data", type=str, default="data/data_for_attack.csv", help="Исходные образы (CSV)")
+    parser.add_argument("--output-path", type=str, default="model/augmentation_data.json", help="Манифест")
+    parser.add_argument("--variants", type=int, default=100, help="Вариантов на образ")
+    parser.add_argument("--parents-per-variant", type=int, default=3, help="Родителей в варианте")
+    parser.add_argument("--sigma-scale", type=float, default=0.5, help="Амплитуда сдвига (доли СКО)")
+    parser.add_argument("--correlation-path", type=str, default=None,
+                        help="correlation.npz: знаки связей, если их нет в graph.json")
+    parser.add_argument("--correlation-class", type=int, default=None, help="Класс матрицы в correlation.npz")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="Вариантов в порции (при том же seed влияет на результат)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора")
+
+    args = parser.parse_args()
+    stage_02_augment(
+        graph_json_path=args.graph_path,
+        data_csv=args.data,
+        output_path=args.output_path,
+        correlation_path=args.correlation_path,
+        correlation_class=args.correlation_class,
+        variants_per_sample=args.variants,
+        parents_per_variant=args.parents_per_variant,
+        sigma_scale=args.sigma_scale,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+    )
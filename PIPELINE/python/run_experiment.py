@@ -4,12 +4,23 @@
 import subprocess
 import json
 import csv
+import math
+import sys
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Tuple
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Tuple
 import yaml
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'nct_attack'))
+from nct_model import iter_feature_chunks, load_compiled_model
+from robustness import minimal_perturbation_radii
+from results_db import ResultsDB, file_hash
+
 class AttackConfig:
     def __init__(self, name: str, **params):
         self.name = name
@@ -27,10 +38,22 @@ class ExperimentRunner:
         self.run_id = self.config.get('run_id', datetime.now().strftime("%Y%m%d_%H%M%S"))
         self.run_dir = Path(self.config.get('output_dir', 'runs')) / self.run_id
         self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.results_db_path = Path(self.config.get(
+            'results_db', Path(self.config.get('output_dir', 'runs')) / 'results.db'))
+        self.timings: Dict[str, float] = {}
 
         print(f"[*] Run ID: {self.run_id}")
         print(f"[*] Output: {self.run_dir}")
 
+    @contextmanager
+    def timed(self, phase: str):
+        """Замер длительности фазы -> self.timings[phase]"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
     def load_data(self, csv_path: str) -> List[Tuple[int, int, List[float]]]:
         """Загрузка CSV в формате: id,class,split,f0..f511"""
         print(f"[*] Loading data from {csv_path}...")
@@ -153,22 +176,333 @@ class ExperimentRunner:
 
         return metrics
 
+    def collect_sample_outcomes(self, pred_clean_json: str, pred_adv_json: str) -> List[Dict]:
+        """Исходы по образцам для базы результатов"""
+        with open(pred_clean_json, 'r') as f:
+            pred_clean = json.load(f)
+        with open(pred_adv_json, 'r') as f:
+            pred_adv = json.load(f)
+
+        predictions_adv = {p['id']: p for p in pred_adv['predictions']}
+        samples = []
+        for index, clean in enumerate(pred_clean['predictions']):
+            adv = predictions_adv.get(clean['id'], {})
+            samples.append({
+                'sample_index': index,
+                'sample_id': clean['id'],
+                'true_class': clean.get('true_class'),
+                'hamming_clean': clean.get('best_hamming', clean.get('hamming_distance')),
+                'hamming_adv': adv.get('best_hamming', adv.get('hamming_distance')),
+                'success': clean.get('pred_class') != adv.get('pred_class'),
+            })
+        return samples
+
+    def record_results(self, results: Dict, attack_name: str, epsilon=None,
+                       target_nct=None, samples: List[Dict] = None):
+        """Добавить прогон в базу результатов (SQLite)"""
+        metrics = dict(results.get('metrics', results.get('summary', {})))
+        metrics.update({f"attack_{k}": v for k, v in results.get('attack_stats', {}).items()})
+
+        with ResultsDB(str(self.results_db_path)) as db:
+            key = db.record_run(
+                self.run_id,
+                source='python',
+                attack_name=attack_name,
+                epsilon=epsilon,
+                model_path=self.config['model_meta'],
+                target_nct=target_nct,
+                data_path=self.config['data_csv'],
+                config=results['config'],
+                metrics=metrics,
+                samples=samples,
+                timings=self.timings,
+                timestamp=results['timestamp'],
+                imported_from=str(self.run_dir),
+                model_hash=results.get('model_hash'),
+            )
+        print(f"[*] Recorded in {self.results_db_path} as {key}")
+
+    def run_robustness(self):
+        """Кривая устойчивости: минимальный радиус FGSM-шума для каждого образца за один прогон"""
+        print("=" * 60)
+        print(f"NCT Robustness Curve")
+        print("=" * 60)
+
+        params = self.config.get('robustness', {})
+        target_nct = params.get('target_nct', 0)
+
+        with self.timed('load'):
+            data = self.load_data(self.config['data_csv'])
+            X = np.array([features for _, _, features in data], dtype=np.float64)
+
+            print(f"[*] Loading model from {self.config['model_meta']}...")
+            model = load_compiled_model(self.config['model_meta'])
+
+        print(f"[*] Bisecting perturbation radii (NCT {target_nct})...")
+        with self.timed('bisection'):
+            result = minimal_perturbation_radii(
+                model.ncts[target_nct],
+                X,
+                eps_max=params.get('eps_max', 1.0),
+                precision=params.get('precision', 1e-3),
+                hamming_threshold=params.get('hamming_threshold', 15),
+                min_hamming_shift=params.get('min_hamming_shift'),
+                n_directions=params.get('n_directions', 1),
+                seed=params.get('seed', 42),
+                bracket_levels=params.get('bracket_levels', 8),
+            )
+        summary = result.summary()
+
+        results = {
+            'run_id': self.run_id,
+            'timestamp': datetime.now().isoformat(),
+            # хэш meta.json на момент прогона: импорт из results.json не зависит от рабочей директории
+            'model_hash': file_hash(self.config['model_meta']),
+            'config': {
+                'data': self.config['data_csv'],
+                'model': self.config['model_meta'],
+                'robustness': {'target_nct': target_nct, **params},
+            },
+            'summary': {k: (None if isinstance(v, float) and math.isinf(v) else v) for k, v in summary.items()},
+            'curve': result.curve(),
+            'timings': self.timings,
+        }
+
+        samples = [
+            {
+                'id': sample_id,
+                'class': class_label,
+                'radius': None if math.isinf(radius) else float(radius),
+                'hamming_clean': int(h_clean),
+                'hamming_at_radius': int(h_adv),
+            }
+            for (sample_id, class_label, _), radius, h_clean, h_adv in zip(
+                data, result.radii, result.hamming_clean, result.hamming_at_radius)
+        ]
+        if self.config.get('logging', {}).get('save_predictions', False):
+            results['samples'] = samples
+
+        results_json = self.run_dir / 'robustness.json'
+        with open(results_json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        self.record_results(
+            results,
+            attack_name='robustness',
+            target_nct=target_nct,
+            samples=[
+                {'sample_id': s['id'], 'true_class': s['class'], 'radius': s['radius'],
+                 'hamming_clean': s['hamming_clean'], 'hamming_adv': s['hamming_at_radius'],
+                 'success': s['radius'] is not None}
+                for s in samples
+            ],
+        )
+
+        print(f"\n" + "=" * 60)
+        print(f"RESULTS:")
+        print(f"  Success rate @ eps_max={summary['eps_max']}: {summary['success_rate_at_eps_max']:.2%}")
+        print(f"  Median radius: {summary['median_radius']:.4f}")
+        print(f"  AUC: {summary['auc']:.4f}")
+        print(f"  Model evaluations: {summary['n_evaluations']} batches")
+        print(f"\nFull results: {results_json}")
+        print("=" * 60)
+
+    def attack_chunk(self, X: np.ndarray, attack_config: AttackConfig,
+                     rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Атака одного блока (n, 512) -> (X_adv, нормы возмущений); то же, что attack_identity / attack_fgsm"""
+        if attack_config.name == 'identity':
+            return X.copy(), np.zeros(X.shape[0])
+        if attack_config.name == 'fgsm':
+            epsilon = attack_config.params.get('epsilon', 0.01)
+            norm = attack_config.params.get('norm', 'l2')
+            delta = rng.standard_normal(X.shape) * epsilon
+            X_adv = X + np.clip(delta, -epsilon * 3, epsilon * 3)
+            norms = np.linalg.norm(delta, axis=1) if norm == 'l2' else np.abs(delta).max(axis=1)
+            return X_adv, norms
+        raise ValueError(f"Unknown attack: {attack_config.name}")
+
+    def iter_attacked_chunks(self, attack_config: AttackConfig, chunk_size: int,
+                             seed: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Генератор: чтение блока -> атака -> (ids, classes, X, X_adv, norms)"""
+        rng = np.random.default_rng(seed)
+        for ids, classes, X in iter_feature_chunks(self.config['data_csv'], chunk_size):
+            with self.timed('attack'):
+                X_adv, norms = self.attack_chunk(X, attack_config, rng)
+            yield ids, classes, X, X_adv, norms
+
+    def run_streaming(self):
+        """Потоковый прогон: блоки проходят загрузку -> атаку -> инференс -> метрики без промежуточных CSV.
+
+        Инференс (пакетный VerifyImage на NumPy) блока k выполняется в отдельном потоке,
+        пока атакуется блок k+1; в очереди не больше max_pending блоков, поэтому память
+        ограничена размером блока, а не датасета.
+
+        Метрики attack_success_rate / avg_hamming_* — те же, что у C# infer (класс — argmin
+        Хэмминга по всем NCT); смена решения "Свой" на target_nct — в decision_flip_* и
+        avg_hamming_target_*. В базу прогон пишется как "<атака>_streaming".
+        """
+        print("=" * 60)
+        print(f"NCT Adversarial Robustness Pipeline (streaming)")
+        print("=" * 60)
+
+        params = self.config.get('streaming', {})
+        chunk_size = params.get('chunk_size', 10000)
+        target_nct = params.get('target_nct', 0)
+        hamming_threshold = params.get('hamming_threshold', 15)
+        max_pending = max(1, params.get('max_pending', 2))
+        save_predictions = self.config.get('logging', {}).get('save_predictions', False)
+
+        attack_config = AttackConfig(
+            self.config['attack']['name'],
+            **self.config['attack'].get('params', {})
+        )
+
+        with self.timed('load'):
+            print(f"[*] Loading model from {self.config['model_meta']}...")
+            ncts = load_compiled_model(self.config['model_meta']).ncts
+
+        def infer(ids, classes, X, X_adv, norms):
+            # (2n, n_ncts): Хэмминг по каждому NCT, как в C# infer
+            start = time.perf_counter()
+            batch = np.concatenate([X, X_adv])
+            hamming = np.stack([nct.hamming_batch(batch) for nct in ncts], axis=1)
+            elapsed = time.perf_counter() - start
+            return ids, classes, hamming[:X.shape[0]], hamming[X.shape[0]:], norms, elapsed
+
+        totals = {'n': 0, 'success': 0, 'hamming_clean': 0.0, 'hamming_adv': 0.0,
+                  'flip': 0, 'target_clean': 0.0, 'target_adv': 0.0, 'norm': 0.0}
+        samples_csv = self.run_dir / 'samples.csv'
+        samples_file = open(samples_csv, 'w', newline='') if save_predictions else None
+        writer = csv.writer(samples_file) if samples_file else None
+        if writer:
+            writer.writerow(['id', 'class', 'pred_clean', 'pred_adv', 'hamming_clean', 'hamming_adv',
+                             'hamming_target_clean', 'hamming_target_adv', 'norm', 'success', 'decision_flip'])
+
+        def consume(result):
+            ids, classes, H_clean, H_adv, norms, elapsed = result
+            self.timings['inference'] = self.timings.get('inference', 0.0) + elapsed
+            with self.timed('metrics'):
+                # как compute_metrics: успех — смена класса с минимальным Хэммингом
+                pred_clean, pred_adv = H_clean.argmin(axis=1), H_adv.argmin(axis=1)
+                h_clean, h_adv = H_clean.min(axis=1), H_adv.min(axis=1)
+                success = pred_clean != pred_adv
+                # смена решения "Свой" на атакуемом NCT
+                t_clean, t_adv = H_clean[:, target_nct], H_adv[:, target_nct]
+                flip = (t_clean < hamming_threshold) != (t_adv < hamming_threshold)
+                totals['n'] += ids.size
+                totals['success'] += int(success.sum())
+                totals['hamming_clean'] += float(h_clean.sum())
+                totals['hamming_adv'] += float(h_adv.sum())
+                totals['flip'] += int(flip.sum())
+                totals['target_clean'] += float(t_clean.sum())
+                totals['target_adv'] += float(t_adv.sum())
+                totals['norm'] += float(norms.sum())
+                if writer:
+                    writer.writerows(zip(ids.tolist(), classes.tolist(), pred_clean.tolist(), pred_adv.tolist(),
+                                         h_clean.tolist(), h_adv.tolist(), t_clean.tolist(), t_adv.tolist(),
+                                         norms.tolist(), success.tolist(), flip.tolist()))
+            if 'time_to_first_metric' not in self.timings:
+                self.timings['time_to_first_metric'] = time.perf_counter() - run_start
+            n = totals['n']
+            print(f"    {n} samples: success rate {totals['success'] / n:.2%}, "
+                  f"avg Hamming {totals['hamming_clean'] / n:.2f} -> {totals['hamming_adv'] / n:.2f}")
+
+        print(f"[*] Streaming {self.config['data_csv']} in chunks of {chunk_size} (NCT {target_nct})...")
+        run_start = time.perf_counter()
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                for chunk in self.iter_attacked_chunks(attack_config, chunk_size, params.get('seed', 42)):
+                    pending.append(executor.submit(infer, *chunk))
+                    while len(pending) >= max_pending:
+                        consume(pending.popleft().result())
+                while pending:
+                    consume(pending.popleft().result())
+        finally:
+            if samples_file:
+                samples_file.close()
+        self.timings['total'] = time.perf_counter() - run_start
+
+        n = totals['n']
+        metrics = {
+            'attack_success_rate': totals['success'] / n if n > 0 else 0,
+            'misclassified_count': totals['success'],
+            'avg_hamming_clean': totals['hamming_clean'] / n if n > 0 else 0,
+            'avg_hamming_adv': totals['hamming_adv'] / n if n > 0 else 0,
+            'total_samples': n,
+            'decision_flip_rate': totals['flip'] / n if n > 0 else 0,
+            'decision_flip_count': totals['flip'],
+            'avg_hamming_target_clean': totals['target_clean'] / n if n > 0 else 0,
+            'avg_hamming_target_adv': totals['target_adv'] / n if n > 0 else 0,
+        }
+
+        results = {
+            'run_id': self.run_id,
+            'timestamp': datetime.now().isoformat(),
+            'model_hash': file_hash(self.config['model_meta']),
+            'config': {
+                'data': self.config['data_csv'],
+                'attack': attack_config.to_dict(),
+                'model': self.config['model_meta'],
+                'streaming': {'chunk_size': chunk_size, 'target_nct': target_nct,
+                              'hamming_threshold': hamming_threshold, 'max_pending': max_pending},
+            },
+            'attack_stats': {'num_queries': n if attack_config.name != 'identity' else 0,
+                             'avg_norm': totals['norm'] / n if n > 0 else 0},
+            'metrics': metrics,
+            'files': {'samples': str(samples_csv)} if save_predictions else {},
+            'timings': self.timings
+        }
+
+        results_json = self.run_dir / 'results.json'
+        with open(results_json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        self.record_results(
+            results,
+            # отдельное имя: потоковые прогоны не смешиваются с пакетными в runs_frame(attack_name=...)
+            attack_name=f"{attack_config.name}_streaming",
+            epsilon=attack_config.params.get('epsilon') if attack_config.name != 'identity' else None,
+            target_nct=target_nct,
+            # исходы по образцам — только в samples.csv: в памяти держится лишь текущий блок
+            samples=None,
+        )
+
+        print(f"\n" + "=" * 60)
+        print(f"RESULTS:")
+        print(f"  Attack success rate: {metrics['attack_success_rate']:.2%}")
+        print(f"  Misclassified samples: {metrics['misclassified_count']}/{metrics['total_samples']}")
+        print(f"  Avg Hamming (clean): {metrics['avg_hamming_clean']:.2f}")
+        print(f"  Avg Hamming (adv): {metrics['avg_hamming_adv']:.2f}")
+        print(f"  Decision flip rate (NCT {target_nct}): {metrics['decision_flip_rate']:.2%}")
+        print(f"  Time to first metric: {self.timings.get('time_to_first_metric', 0.0):.2f}s "
+              f"(total {self.timings['total']:.2f}s)")
+        print(f"\nFull results: {results_json}")
+        print("=" * 60)
+
     def run(self):
         """Запустить полный pipeline"""
+        if self.config.get('mode', 'attack') == 'robustness':
+            return self.run_robustness()
+        if self.config.get('mode', 'attack') == 'streaming':
+            return self.run_streaming()
+
         print("=" * 60)
         print(f"NCT Adversarial Robustness Pipeline")
         print("=" * 60)
 
         # 1. Загружаем данные
-        data = self.load_data(self.config['data_csv'])
+        with self.timed('load'):
+            data = self.load_data(self.config['data_csv'])
 
         # 2. Выполняем инференс на чистых данных
         print(f"\n[PHASE 1] Clean inference baseline...")
         clean_csv = self.run_dir / 'input_clean.csv'
         pred_clean_json = self.run_dir / 'pred_clean.json'
 
-        self.export_csv(data, str(clean_csv))
-        self.run_inference(str(clean_csv), str(pred_clean_json))
+        with self.timed('clean_inference'):
+            self.export_csv(data, str(clean_csv))
+            self.run_inference(str(clean_csv), str(pred_clean_json))
 
         # 3. Выполняем атаку
         print(f"\n[PHASE 2] Adversarial attack...")
@@ -177,16 +511,17 @@ class ExperimentRunner:
             **self.config['attack'].get('params', {})
         )
 
-        if attack_config.name == 'identity':
-            attacked, attack_stats = self.attack_identity(data)
-        elif attack_config.name == 'fgsm':
-            attacked, attack_stats = self.attack_fgsm(
-                data,
-                epsilon=attack_config.params.get('epsilon', 0.01),
-                norm=attack_config.params.get('norm', 'l2')
-            )
-        else:
-            raise ValueError(f"Unknown attack: {attack_config.name}")
+        with self.timed('attack'):
+            if attack_config.name == 'identity':
+                attacked, attack_stats = self.attack_identity(data)
+            elif attack_config.name == 'fgsm':
+                attacked, attack_stats = self.attack_fgsm(
+                    data,
+                    epsilon=attack_config.params.get('epsilon', 0.01),
+                    norm=attack_config.params.get('norm', 'l2')
+                )
+            else:
+                raise ValueError(f"Unknown attack: {attack_config.name}")
 
         # 4. Экспортируем атакованные примеры
         attacked_data = [
@@ -197,24 +532,27 @@ class ExperimentRunner:
         adv_csv = self.run_dir / 'input_adv.csv'
         pred_adv_json = self.run_dir / 'pred_adv.json'
 
-        self.export_csv(attacked_data, str(adv_csv))
-
         # 5. Выполняем инференс на атакованных данных
         print(f"\n[PHASE 3] Adversarial inference...")
-        self.run_inference(str(adv_csv), str(pred_adv_json))
+        with self.timed('adv_inference'):
+            self.export_csv(attacked_data, str(adv_csv))
+            self.run_inference(str(adv_csv), str(pred_adv_json))
 
         # 6. Считаем метрики
         print(f"\n[PHASE 4] Computing metrics...")
-        metrics = self.compute_metrics(str(pred_clean_json), str(pred_adv_json))
+        with self.timed('metrics'):
+            metrics = self.compute_metrics(str(pred_clean_json), str(pred_adv_json))
 
         # 7. Сохраняем результаты
         results = {
             'run_id': self.run_id,
             'timestamp': datetime.now().isoformat(),
+            'model_hash': file_hash(self.config['model_meta']),
             'config': {
                 'data': self.config['data_csv'],
                 'attack': attack_config.to_dict(),
-                'model': self.config['model_bin']
+                'model': self.config['model_bin'],
+                'model_meta': self.config['model_meta'],
             },
             'attack_stats': attack_stats,
             'metrics': metrics,
@@ -223,13 +561,22 @@ class ExperimentRunner:
                 'pred_clean': str(pred_clean_json),
                 'input_adv': str(adv_csv),
                 'pred_adv': str(pred_adv_json)
-            }
+            },
+            'timings': self.timings
         }
 
         results_json = self.run_dir / 'results.json'
         with open(results_json, 'w') as f:
             json.dump(results, f, indent=2)
 
+        self.record_results(
+            results,
+            attack_name=attack_config.name,
+            epsilon=attack_config.params.get('epsilon') if attack_config.name != 'identity' else None,
+            target_nct=self.config.get('target_nct'),
+            samples=self.collect_sample_outcomes(str(pred_clean_json), str(pred_adv_json)),
+        )
+
         print(f"\n" + "=" * 60)
         print(f"RESULTS:")
         print(f"  Attack success rate: {metrics['attack_success_rate']:.2%}")